@@ -0,0 +1,316 @@
+"""
+Equivalence benchmark of the fast implementations in support_functions against the frozen reference engines in
+benchmarks/reference.
+
+Both engines run side by side on every trial of the bundled data set and on synthetic gait signals. For each metric
+the largest absolute and relative deviation of its outputs and the speedup of the fast engine are reported, and every
+trial whose outputs differ by more than the tolerance is flagged. The benchmark fails (exit code 1) if any trial is
+flagged.
+
+Run from the root folder of the repository:
+    python -m benchmarks.equivalence
+    python -m benchmarks.equivalence --metrics sample_entropy FNN --limit 3
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.reference import LyE as reference_LyE
+from benchmarks.reference.dfa import dfa as reference_dfa
+from benchmarks.reference.euclidean_norm import euclidean_norm as reference_norm
+from benchmarks.reference.ldlj import log_dimensionless_jerk_strides as reference_ldlj_strides
+from benchmarks.reference.rqa import rqa as reference_rqa
+from benchmarks.reference.sample_entropy import sample_entropy as reference_sample_entropy
+from benchmarks.reference.symmetry import symmetry as reference_symmetry
+from support_functions import LyE
+from support_functions.dfa import dfa, dfa_scales
+from support_functions.euclidean_norm import euclidean_norm
+from support_functions.ldlj import log_dimensionless_jerk_strides
+from support_functions.load_shards import load_data
+from support_functions.outdoor2zoo import build_zoo
+from support_functions.rqa import rqa
+from support_functions.sample_entropy import sample_entropy
+from support_functions.steps import detect_steps
+from support_functions.symmetry import symmetry
+from support_functions.synthetic import synthetic_trial
+
+# Some hard coded values
+CHANNELS = ["Acc_x", "Acc_y", "Acc_z"]
+GYRO_CHANNELS = ["Gyr_x", "Gyr_y", "Gyr_z"]  # added to the trials for the LDLJ with gyroscope, see with_gyro
+GYRO_SD = 0.5  # rad/s, of the synthetic angular velocities
+DATA_FILE = 'data.json.zip'  # bundled data set, relative to the root folder
+SYNTHETIC_LENGTHS = [1000, 2000, 4000]  # samples, at the SAMPLE_RATE of outdoor2zoo
+SYNTHETIC_SEED = 0
+RTOL = 1e-9
+ATOL = 1e-12
+REPEATS = 1
+
+
+# The metrics to compare. Each runs on the zoo data of a trial and its last step index, and returns a dict of named
+# outputs. AMI_Stergiou and FNN run on the Euclidean norm, with the parameters LyE_R uses, dfa on the Euclidean norm
+# with the default window sizes, rqa on the Euclidean norm embedded as LyE_R embeds it, and the LDLJ of the strides
+# of the detected steps, without and with synthetic gyroscope signals.
+def _sample_entropy(engine, data, event):
+    sampen, norm = engine(data, CHANNELS, event=event)
+    return {'sampen': sampen, 'norm': norm}
+
+
+def _symmetry(engine, data, event):
+    d_1, ad_1, d_2, ad_2, autocorr = engine(data, CHANNELS, event=event)
+    return {'d1': d_1, 'ad1': ad_1, 'd2': d_2, 'ad2': ad_2, 'autocorr': autocorr}
+
+
+def _LyE_R(engine, data, event):
+    lds, AveLnDiv = engine(data, CHANNELS, event=event)
+    return {'LyEs': lds[0], 'LyEl': lds[1], 'AveLnDiv': AveLnDiv}
+
+
+def _AMI_Stergiou(engine, norm):
+    tau, v_AMI = engine(np.copy(norm), 30)
+    return {'tau': tau, 'AMI': v_AMI}
+
+
+def _FNN(engine, norm, tau):
+    dE, dim = engine(np.copy(norm), tau, 12, 15, 2, 1)
+    return {'dE': dE, 'dim': dim}
+
+
+def _dfa(engine, norm):
+    alpha, scales, fluctuation = engine(norm, dfa_scales(len(norm)))
+    return {'alpha': alpha, 'fluctuation': fluctuation}
+
+
+def _rqa(engine, norm, tau, dim):
+    measures, diagonal = engine(norm, tau, dim)
+    return dict(measures, diagonal=diagonal)
+
+
+def _ldlj_strides(engine, data, event, gyro=None):
+    steps = detect_steps(euclidean_norm(data, CHANNELS)[:event], data["zoosystem"]["Video"]["Freq"])
+    strides = np.column_stack((steps[:-2:2], steps[2::2]))
+    return {'ldlj': engine(data, CHANNELS, strides, gyro)}
+
+
+def _tau(norm):
+    # the time delay LyE_R embeds with, from the reference AMI
+    return int(reference_LyE.AMI_Stergiou(np.copy(norm), 30)[0][0][0])
+
+
+def _embedding(norm):
+    # the time delay and embedding dimension LyE_R embeds with, from the reference AMI and FNN
+    tau = _tau(norm)
+    return tau, int(reference_LyE.FNN(np.copy(norm), tau, 12, 15, 2, 1)[1])
+
+
+METRICS = {
+    'sample_entropy': (lambda data, event: _sample_entropy(reference_sample_entropy, data, event),
+                       lambda data, event: _sample_entropy(sample_entropy, data, event)),
+    'symmetry': (lambda data, event: _symmetry(reference_symmetry, data, event),
+                 lambda data, event: _symmetry(symmetry, data, event)),
+    'LyE_R': (lambda data, event: _LyE_R(reference_LyE.LyE_R, data, event),
+              lambda data, event: _LyE_R(LyE.LyE_R, data, event)),
+    'AMI_Stergiou': (lambda data, event: _AMI_Stergiou(reference_LyE.AMI_Stergiou,
+                                                       reference_norm(data, CHANNELS)[:event]),
+                     lambda data, event: _AMI_Stergiou(LyE.AMI_Stergiou, euclidean_norm(data, CHANNELS)[:event])),
+    'FNN': (lambda data, event: _FNN(reference_LyE.FNN, reference_norm(data, CHANNELS)[:event],
+                                     _tau(reference_norm(data, CHANNELS)[:event])),
+            lambda data, event: _FNN(LyE.FNN, euclidean_norm(data, CHANNELS)[:event],
+                                     _tau(reference_norm(data, CHANNELS)[:event]))),
+    'dfa': (lambda data, event: _dfa(reference_dfa, reference_norm(data, CHANNELS)[:event]),
+            lambda data, event: _dfa(dfa, euclidean_norm(data, CHANNELS)[:event])),
+    'rqa': (lambda data, event: _rqa(reference_rqa, reference_norm(data, CHANNELS)[:event],
+                                     *_embedding(reference_norm(data, CHANNELS)[:event])),
+            lambda data, event: _rqa(rqa, euclidean_norm(data, CHANNELS)[:event],
+                                     *_embedding(reference_norm(data, CHANNELS)[:event]))),
+    'ldlj_strides': (lambda data, event: _ldlj_strides(reference_ldlj_strides, data, event),
+                     lambda data, event: _ldlj_strides(log_dimensionless_jerk_strides, data, event)),
+    'ldlj_strides_gyro': (lambda data, event: _ldlj_strides(reference_ldlj_strides, with_gyro(data), event,
+                                                            GYRO_CHANNELS),
+                          lambda data, event: _ldlj_strides(log_dimensionless_jerk_strides, with_gyro(data), event,
+                                                            GYRO_CHANNELS)),
+}
+
+
+def with_gyro(data, seed=SYNTHETIC_SEED):
+    """
+    Adds angular velocities to a trial, as a 6-axis IMU would record them. The trials of the data set only have
+    accelerations.
+
+    :param data: zoo data of a trial.
+    :param seed: seed of the random generator, so that a trial gets the same angular velocities in every run.
+    :return: a copy of the zoo data with the GYRO_CHANNELS.
+    """
+    n = len(data[CHANNELS[0]]['line'])
+    gyros = GYRO_SD * np.random.default_rng(seed).standard_normal((n, len(GYRO_CHANNELS)))
+    data = dict(data)
+    for i, ch in enumerate(GYRO_CHANNELS):
+        data[ch] = {'line': gyros[:, i], 'event': {}}
+
+    return data
+
+
+def bundled_trials(data_file, limit=None):
+    """
+    Reads the trials of the bundled data set.
+
+    :param data_file: str. Full path to data.json, or a zip archive that contains it.
+    :param limit: int. Maximum number of trials. None reads all.
+    :return: list of (name, data, last step index).
+    """
+    trials = []
+    r = load_data(data_file)
+    for c in r.keys():
+        for s in r[c].keys():
+            fname = "{0}_{1}".format(s, c)
+            data = build_zoo(r[c][s], fname + '.zoo')
+            trials.append((fname, data, data["Acc_x"]["event"]["FS1"][0]))
+
+    trials.sort(key=lambda trial: trial[0])
+    return trials[:limit]
+
+
+def synthetic_trials(lengths=None, seed=SYNTHETIC_SEED):
+    """
+    Creates gait-like accelerations with the generator of synthetic cohorts, see synthetic_trial.
+
+    :param lengths: list of the number of samples per trial. Default is SYNTHETIC_LENGTHS.
+    :param seed: seed of the random generator, so that the trials are the same in every run.
+    :return: list of (name, data, last step index).
+    """
+    if lengths is None:
+        lengths = SYNTHETIC_LENGTHS
+
+    rng = np.random.default_rng(seed)
+    trials = []
+    for n in lengths:
+        trial = synthetic_trial(n, rng=rng)
+        fname = 'synthetic_{0}'.format(n)
+        trials.append((fname, build_zoo(trial, fname + '.zoo'), trial['last_step_index']))
+
+    return trials
+
+
+def compare(reference, fast, rtol=RTOL, atol=ATOL):
+    """
+    Compares the outputs of the reference and fast engine.
+
+    :param reference: dict of named outputs of the reference engine.
+    :param fast: dict of named outputs of the fast engine.
+    :return: abs_dev: largest absolute deviation over all outputs. Inf if the shapes differ.
+    rel_dev: largest deviation relative to the reference value.
+    diverged: list of the names of the outputs that differ by more than the tolerance.
+    """
+    abs_dev = 0.0
+    rel_dev = 0.0
+    diverged = []
+    for name in reference:
+        ref = np.asarray(reference[name], dtype=float)
+        out = np.asarray(fast.get(name, np.nan), dtype=float)
+        if ref.shape != out.shape:
+            abs_dev = rel_dev = np.inf
+            diverged.append(name)
+            continue
+
+        both_nan = np.isnan(ref) & np.isnan(out)
+        dev = np.where(both_nan, 0, np.abs(ref - out))
+        dev = np.where(np.isnan(dev), np.inf, dev)
+        if dev.size:
+            abs_dev = max(abs_dev, float(np.max(dev)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rel = np.where(dev == 0, 0, dev / np.abs(ref))
+            rel_dev = max(rel_dev, float(np.max(rel)))
+        if not np.allclose(out, ref, rtol=rtol, atol=atol, equal_nan=True):
+            diverged.append(name)
+
+    return abs_dev, rel_dev, diverged
+
+
+def run_engine(engine, data, event, repeats=REPEATS):
+    """
+    Runs an engine repeats times.
+
+    :return: outputs: dict of named outputs, or the exception the engine raised.
+    seconds: fastest run time.
+    """
+    times = []
+    outputs = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        try:
+            outputs = engine(data, event)
+        except Exception as e:
+            outputs = e
+        times.append(time.perf_counter() - start_time)
+
+    return outputs, min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=DATA_FILE, help='bundled data set (default: %(default)s)')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of trials of the data set')
+    parser.add_argument('--metrics', nargs='+', choices=list(METRICS), default=list(METRICS))
+    parser.add_argument('--rtol', type=float, default=RTOL)
+    parser.add_argument('--atol', type=float, default=ATOL)
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='runs per engine, the fastest is reported')
+    args = parser.parse_args(argv)
+
+    trials = []
+    if os.path.exists(args.data):
+        trials += bundled_trials(args.data, args.limit)
+    else:
+        print('{0} not found, running on synthetic signals only'.format(args.data))
+    trials += synthetic_trials()
+
+    flagged = []
+    print('{0:<16} {1:<24} {2:>12} {3:>12} {4:>10} {5:>10} {6:>8}'.format(
+        'metric', 'trial', 'abs dev', 'rel dev', 'ref (s)', 'fast (s)', 'speedup'))
+    for metric in args.metrics:
+        reference_engine, fast_engine = METRICS[metric]
+        abs_devs, rel_devs, ref_times, fast_times = [], [], [], []
+        for name, data, event in trials:
+            reference, ref_time = run_engine(reference_engine, data, event, args.repeats)
+            fast, fast_time = run_engine(fast_engine, data, event, args.repeats)
+
+            if isinstance(reference, Exception) or isinstance(fast, Exception):
+                # both engines must fail in the same way
+                same = type(reference) is type(fast)
+                abs_dev = rel_dev = 0.0 if same else np.inf
+                diverged = [] if same else ['{0!r} vs {1!r}'.format(reference, fast)]
+            else:
+                abs_dev, rel_dev, diverged = compare(reference, fast, args.rtol, args.atol)
+
+            abs_devs.append(abs_dev)
+            rel_devs.append(rel_dev)
+            ref_times.append(ref_time)
+            fast_times.append(fast_time)
+            print('{0:<16} {1:<24} {2:>12.3g} {3:>12.3g} {4:>10.3f} {5:>10.3f} {6:>7.1f}x {7}'.format(
+                metric, name, abs_dev, rel_dev, ref_time, fast_time, ref_time / fast_time,
+                'DIVERGED: ' + ', '.join(diverged) if diverged else ''))
+            if diverged:
+                flagged.append((metric, name, diverged))
+
+        print('{0:<16} {1:<24} {2:>12.3g} {3:>12.3g} {4:>10.3f} {5:>10.3f} {6:>7.1f}x'.format(
+            metric, 'ALL', max(abs_devs), max(rel_devs), sum(ref_times), sum(fast_times),
+            sum(ref_times) / sum(fast_times)))
+        print(' ')
+
+    if flagged:
+        print('{0} trial(s) diverged beyond rtol={1:g}, atol={2:g}:'.format(len(flagged), args.rtol, args.atol))
+        for metric, name, diverged in flagged:
+            print('  {0} {1}: {2}'.format(metric, name, ', '.join(diverged)))
+        return 1
+
+    print('All trials match within rtol={0:g}, atol={1:g}'.format(args.rtol, args.atol))
+    return 0
+
+
+if __name__ == '__main__':
+    with warnings.catch_warnings():
+        # the reference engines use deprecated numpy and pandas features
+        warnings.simplefilter('ignore')
+        sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Cold-start import benchmark for the modules that main.py and the worker processes import at start-up.
+
+Each module is imported in a fresh interpreter, so that nothing is cached. The benchmark fails (exit code 1) if a
+module pulls in one of the heavy dependencies at import time, or if the import takes longer than the allowed time.
+
+Run from the root folder of the repository:
+    python benchmarks/import_time.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+# Some hard coded values
+MODULES = ['support_functions.outdoor2zoo',
+           'support_functions.engine',
+           'support_functions.fileparts',
+           'support_functions.grab',
+           'support_functions.add_channel',
+           'support_functions.zoo2excel',
+           'support_functions.sample_entropy',
+           'support_functions.symmetry',
+           'support_functions.ldlj',
+           'support_functions.LyE',
+           'support_functions.delay_embedding',
+           'support_functions.zsave',
+           'support_functions.memory',
+           'support_functions.time_budget',
+           'support_functions.registry',
+           'support_functions.range_count',
+           'support_functions.cross_sample_entropy',
+           'support_functions.dfa',
+           'support_functions.rqa',
+           'support_functions.steps',
+           'support_functions.embedding_cache',
+           'support_functions.progress',
+           'support_functions.synthetic',
+           'support_functions.load_shards',
+           'support_functions.fork_context']
+
+# dependencies that must only be imported when they are first used
+HEAVY = ['tkinter', 'pandas', 'statsmodels', 'scipy', 'numpy.matlib']
+
+MAX_SECONDS = 0.5  # per module, including numpy
+REPEATS = 5
+
+_PROBE = """
+import sys, time
+t = time.perf_counter()
+import {0}
+print(time.perf_counter() - t)
+print(','.join(m for m in {1!r} if m in sys.modules))
+"""
+
+
+def import_time(module):
+    """
+    Imports a module in a fresh interpreter.
+
+    :param module: str. Dotted module name.
+    :return: seconds: median import time over REPEATS runs.
+    heavy: list of heavy dependencies that were imported.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    heavy = []
+    for _ in range(REPEATS):
+        out = subprocess.run([sys.executable, '-c', _PROBE.format(module, HEAVY)], cwd=root, check=True,
+                             capture_output=True, text=True).stdout.splitlines()
+        times.append(float(out[0]))
+        heavy = [m for m in out[1].split(',') if m] if len(out) > 1 else []
+
+    return statistics.median(times), heavy
+
+
+def main():
+    failed = False
+    for module in MODULES:
+        seconds, heavy = import_time(module)
+        status = 'ok'
+        if heavy:
+            status = 'FAIL imports {0}'.format(', '.join(heavy))
+        elif seconds > MAX_SECONDS:
+            status = 'FAIL slower than {0:.2f} s'.format(MAX_SECONDS)
+        failed = failed or status != 'ok'
+        print('{0:<40} {1:>8.3f} s  {2}'.format(module, seconds, status))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Frozen reference engines: verbatim copies of sample_entropy, symmetry, LyE (with AMI_Stergiou and FNN) and
+euclidean_norm as they were before any of them were optimised. Only the imports are changed, to import each other.
+The metrics that were added later have a reference written for clarity rather than speed, which loops over what the
+fast implementation does at once: dfa, rqa and ldlj.
+
+Do not edit these files. They define the outcomes that the fast implementations in support_functions are checked
+against with benchmarks/equivalence.py.
+"""
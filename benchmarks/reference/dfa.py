@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def dfa(x, scales, order=1):
+    """
+    Detrended fluctuation analysis written for clarity rather than speed: the trend of every window is fitted on its
+    own with np.polyfit. The windows of each size are taken from the start and from the end of the integrated signal,
+    as in support_functions/dfa.py.
+
+    :param x: the signal.
+    :param scales: window sizes in samples.
+    :param order: order of the polynomial trend.
+    :return: alpha; the scaling exponent.
+            scales; the window sizes in samples.
+            fluctuation; the fluctuation of each window size.
+    """
+    x = np.asarray(x, dtype=float)
+    N = len(x)
+    profile = np.cumsum(x - np.mean(x))
+
+    fluctuation = []
+    for n in scales:
+        t = np.arange(n)
+        n_windows = N // n
+        starts = [i * n for i in range(n_windows)] + [N - n_windows * n + i * n for i in range(n_windows)]
+        residuals = []
+        for start in starts:
+            window = profile[start:start + n]
+            trend = np.polyval(np.polyfit(t, window, order), t)
+            residuals.append(np.mean((window - trend) ** 2))
+        fluctuation.append(np.sqrt(np.mean(residuals)))
+
+    alpha = np.polyfit(np.log(scales), np.log(fluctuation), 1)[0]
+
+    return alpha, np.asarray(scales), np.array(fluctuation)
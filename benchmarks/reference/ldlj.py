@@ -0,0 +1,45 @@
+import numpy as np
+
+from support_functions.ldlj import gravity_component
+
+
+def log_dimensionless_jerk_strides(data, ch, strides, gyro=None):
+    """
+    Log dimensionless jerk of each stride written for clarity rather than speed: each stride is cut out of the trial
+    and its factors are calculated as log_dimensionless_jerk_factors does for a whole trial, with the gravity component
+    of the whole trial.
+
+    :param data: dictionary containing all data.
+    :param ch: list of strings that provide the names three acceleration direction.
+    :param strides: (S x 2) array with the first sample and the sample after the last of each stride.
+    :param gyro: list of strings that provide the names of the three angular velocity directions, or None.
+    :return: array with the LDLJ of each stride.
+    """
+    freq = data["zoosystem"]["Video"]["Freq"]
+    dt = 1. / freq
+    grav = gravity_component(np.asarray(data[ch[0]]['line']),
+                             np.asarray(data[ch[1]]["line"]),
+                             np.asarray(data[ch[2]]["line"]))
+
+    ldlj = []
+    for start, end in np.asarray(strides, dtype=int).reshape(-1, 2):
+        accls = np.column_stack([np.asarray(data[c]['line'])[start:end] for c in ch])
+        N = len(accls)
+
+        mdur = N * dt
+        mamp = np.power(np.linalg.norm(accls), 2) / N
+        if gyro is not None:
+            mamp = mamp - np.power(np.linalg.norm(grav), 2)
+
+        # the derivative of the first sample of the stride is zero
+        _daccls = np.vstack((np.zeros((1, 3)), np.diff(accls, axis=0) * freq))
+        if gyro is not None:
+            gyros = np.column_stack([np.asarray(data[g]['line'])[start:end] for g in gyro])
+            _awcross = np.cross(accls, gyros)
+        else:
+            _awcross = np.zeros(np.shape(accls))
+        mjerk = np.sum(np.power(np.linalg.norm(_daccls - _awcross, axis=1), 2)) * dt
+
+        ldlj.append(-np.log(mdur) + np.log(mamp) - np.log(mjerk))
+
+    return np.array(ldlj)
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def rqa(norm, tau, dim, radius=0.5, lmin=2, vmin=2):
+    """
+    Recurrence quantification analysis written for clarity rather than speed: the dense N x N recurrence matrix is
+    built from all pairwise distances, and the lines are counted diagonal by diagonal and column by column. The
+    definitions are those of support_functions/rqa.py, with the line of identity left out.
+
+    :param norm: the signal, already cut to length.
+    :param tau: time delay in samples.
+    :param dim: embedding dimension.
+    :param radius: points recur within this fraction of the standard deviation of the signal.
+    :param lmin: shortest diagonal line counted for determinism.
+    :param vmin: shortest vertical line counted for laminarity.
+    :return: measures: dict with "RR", "DET", "LAM" and "L".
+            diagonal: number of diagonal lines of length 1, 2, ... in the upper triangle.
+    """
+    norm = np.asarray(norm, dtype=float)
+    M = len(norm) - (dim - 1) * tau
+    Y = np.column_stack([norm[j * tau:j * tau + M] for j in range(dim)])
+
+    distance = np.sqrt(np.sum((Y[:, None, :] - Y[None, :, :]) ** 2, axis=2))
+    R = distance <= radius * np.std(norm)
+    np.fill_diagonal(R, False)
+
+    diagonal_lengths = []
+    for k in range(1, M):
+        diagonal_lengths += _runs(np.diagonal(R, k))
+    vertical_lengths = []
+    for j in range(M):
+        vertical_lengths += _runs(R[:, j])
+
+    n_recurrences = np.sum(R)
+    in_diagonal = sum(length for length in diagonal_lengths if length >= lmin)
+    in_vertical = sum(length for length in vertical_lengths if length >= vmin)
+    n_lines = sum(1 for length in diagonal_lengths if length >= lmin)
+
+    measures = {
+        "RR": n_recurrences / (M * (M - 1)),
+        "DET": 2 * in_diagonal / n_recurrences if n_recurrences else np.nan,
+        "LAM": in_vertical / n_recurrences if n_recurrences else np.nan,
+        "L": in_diagonal / n_lines if n_lines else np.nan,
+    }
+
+    return measures, np.bincount(diagonal_lengths, minlength=1)[1:]
+
+
+# embedded functions
+def _runs(line):
+    """
+    :return: list of the lengths of the runs of True in a boolean line.
+    """
+    lengths = []
+    length = 0
+    for recurrent in line:
+        if recurrent:
+            length += 1
+        elif length:
+            lengths.append(length)
+            length = 0
+    if length:
+        lengths.append(length)
+    return lengths
@@ -1,24 +1,71 @@
 import os
 import shutil
-import zipfile
+import time
 from support_functions.outdoor2zoo import outdoor2zoo
+from support_functions.load_shards import find_data_files
+from support_functions.outdoor2results import outdoor2results
 from support_functions.fileparts import fileparts
 from support_functions.engine import engine
 from support_functions.grab import grab
-from support_functions.add_channel import addchannel_data
-from support_functions.zoo2excel import zoo2excel
-
-# support functions for the non-linear analysis
-from support_functions.sample_entropy import sample_entropy
-from support_functions.symmetry import symmetry
-from support_functions.ldlj import log_dimensionless_jerk_imu
-from support_functions.LyE import LyE_R
+from support_functions.zoo2excel import zoo2excel, extract_results
+from support_functions.analyse_trial import analyse_trial
 from support_functions.zsave import zsave
+from support_functions.memory import track_memory, set_memory_budget, memory_report
+from support_functions.job_queue import create_queue, run_worker, merge_results
+from support_functions.results_db import connect_results, upsert_results, export_csv
+from support_functions.cross_sample_entropy import cross_surface_entropy, add_cross_surface_events
+from support_functions.embedding_cache import set_embedding_cache, cache_report
+from support_functions.progress import set_progress, start_stage, trial_done, end_stage, progress_report
+from support_functions import LyE, time_budget, registry, resample
+
+# Some hardcoded values
+# Data files of the data set in the root folder, zip archives or .json files. Glob patterns are expanded, e.g.
+# ["site_*.zip"] for one archive per site or day, whose conditions and subjects are merged, see load_shards.py.
+DATA_FILES = ["data.json.zip"]
+# Memory budget in bytes per metric. Metrics whose estimated footprint exceeds it switch to a streaming variant.
+# None means no budget.
+MEMORY_BUDGET = None
+set_memory_budget(MEMORY_BUDGET)
+# Distribute Step 2 over several machines that share the data folder, through a job queue in the data folder.
+# Start worker.py on the other machines once the queue is ready. False runs all trials in this process.
+DISTRIBUTED = False
+# Name of the SQLite results database in the root folder, which keeps the results of every run keyed by subject,
+# surface and metric parameters. results.csv is then exported from it. None writes results.csv from the zoo files.
+RESULTS_DB = None
+# Go straight from the data files to results.csv in memory, without writing and re-reading intermediate zoo files.
+# The analysed zoo files are then only saved to the data folder if SAVE_ZOO is True.
+DIRECT = False
+SAVE_ZOO = True
+# Screen with approximate divergence exponents, from a subset of reference points, with 95% confidence intervals in
+# extra columns of results.csv. False calculates the exact exponents.
+LyE.APPROXIMATE = False
+# Time budget in seconds per metric and trial, e.g. {"LyE_R": 60, "sample_entropy": 20}. A metric that exceeds it
+# falls back to a cheaper variant or is skipped, see time_budget.py. Empty means no budgets.
+time_budget.TIME_BUDGETS = {}
+# Metrics to calculate, by their name in support_functions/registry.py, e.g. ["log_dimensionless_jerk_imu",
+# "symmetry"]. Metrics they require are added. None calculates the default metrics.
+registry.SELECTED = None
+# Sample rate in Hz to resample the trials to before the analysis, with an anti-alias filter, e.g. 100 for exports
+# recorded at 200-500 Hz. None keeps the sample rate of the recording.
+resample.TARGET_RATE = None
+# Add the cross-sample entropy between the surfaces of each subject (Step 3), to quantify how similar their gait is
+# across surfaces. False skips it.
+CROSS_SURFACE = False
+# Name of the SQLite cache of the embedding parameters (tau, dim) of LyE_R in the root folder, which keeps them between
+# runs. EMBEDDING_POLICY "estimate" always estimates them, "reuse" reuses those of a similar trial of the same subject
+# and surface, and "cohort" fixes them to the median of the cached trials. None estimates them for every trial.
+EMBEDDING_CACHE = None
+EMBEDDING_POLICY = "reuse"
+# Name of the file in the root folder that the progress of the run (trials per second, time per metric, remaining time
+# and queue depth) is written to, in the Prometheus text format, e.g. "nld.prom" for the textfile collector of the node
+# exporter. None does not write it. VERBOSE prints a line for every trial, instead of only the summary at the end.
+PROGRESS_FILE = None
+VERBOSE = False
 
 # %% Step 1 prepare data
 # Ensure the current working directory is the root of the repository
 fld_root = os.getcwd()
-data_file = os.path.join(fld_root, 'data.json.zip')
+data_files = find_data_files(fld_root, DATA_FILES)
 fld = os.path.join(fld_root, 'data')  # Setting path for processed data
 fld_stats = os.path.join(fld_root, 'Results')
 
@@ -28,11 +75,6 @@ if os.path.exists(fld):
     shutil.rmtree(fld)
 
 os.makedirs(fld)
-print(f'Unzipping data file {data_file}')
-with zipfile.ZipFile(data_file, 'r') as zip_ref:
-    zip_ref.extractall(fld_root)
-# move data file to data folder
-shutil.move("data.json", "data/data.json")
 
 # Remove old stats folder if it exists
 if os.path.exists(fld_stats):
@@ -42,78 +84,79 @@ if os.path.exists(fld_stats):
 print('Creating folder for Excel sheet output...')
 os.makedirs(fld_stats)
 
-# restructure the data from the json dictionary into seperate files.
-outdoor2zoo(fld)
-
-# %% Step 2: re-organize data in folders
-fl = engine(path=fld, extension=".zoo")
-for f in fl:
-    file_path, file_name, ext = fileparts(f)
-
-    # extract subject/condition from file name
-    indx = [i for i, char in enumerate(file_name) if char == '_']
-    subject = file_name[:indx[0]]
-    condition = file_name[indx[0] + 1:]
-    nfld = os.path.join(fld, subject, condition)
-
-    if not os.path.exists(nfld):
-        os.makedirs(nfld)
-
-    # move file to new directory
-    new_file_path = os.path.join(nfld, file_name + ext)
-    print(f'moving {file_name}{ext} to {nfld}')
-    shutil.move(f"{file_name}{ext}", nfld)
-# %% Step 3: Non-linear dynamics analysis
-
-# prepare files
-fl = engine(path=fld, extension=".zoo")
-fl.sort()
-
-for f in fl:
-    file_path, file_name, ext = fileparts(f)
-    print(f'running analysis on {file_name}{ext}')
-
-    # extract subject/condition from file name
-    indx = [i for i, char in enumerate(file_name) if char == '_']
-    subject = file_name[:indx[0]]
-    condition = file_name[indx[0] + 1:]
-
-    # extract the data from file
-    data = grab(f)
-    channels = ["Acc_x", "Acc_y", "Acc_z"]
-    last_step_index = data["Acc_x"]["event"]["FS1"][0]
-
-    # perform non-linear dynamics analysis on all gait trails
-    sampen, norm = sample_entropy(data, channels, event=last_step_index)
-    d_1, ad_1, d_2, ad_2, autocorr = symmetry(data, channels, event=last_step_index)
-    ldlj = log_dimensionless_jerk_imu(data, channels, event=last_step_index)
-    lds, AveLnDiv = LyE_R(data, channels, event=last_step_index)
-
-    # add channels
-    addchannel_data(data, "Acc_euclidean", norm, "video")
-    addchannel_data(data, "Autocorrelation", autocorr, "Video")
-    addchannel_data(data, "Divergence", AveLnDiv, "Video")
-
-    # add the event to the respective channels
-    data["Acc_euclidean"]['event'] = {
-        'sampen': [sampen, 0, 0],
-        "ldlj": [ldlj, 0, 0]
-    }
-
-    data["Autocorrelation"]["event"] = {
-        "d1": [int(d_1), 0, 0],
-        "d2": [int(d_2), 0, 0],
-        "ad1": [float(ad_1), 0, 0],
-        "ad2": [float(ad_2), 0, 0]
-    }
-
-    data["Divergence"]["event"] = {
-        "LyEs": [float(lds[0]), 0, 0],
-        "LyEl": [float(lds[1]), 0, 0]
-    }
-
-    zsave(f, data)
+results_db = connect_results(os.path.join(fld_root, RESULTS_DB)) if RESULTS_DB else None
+set_embedding_cache(os.path.join(fld_root, EMBEDDING_CACHE) if EMBEDDING_CACHE else None, EMBEDDING_POLICY)
+set_progress(os.path.join(fld_root, PROGRESS_FILE) if PROGRESS_FILE else None, VERBOSE)
+start_time = time.time()
+
+if DIRECT:
+    # convert, analyse and extract every trial in memory. This replaces Step 2 and the extraction below.
+    with track_memory('outdoor2results'):
+        outdoor2results(data_files, fld_stats, fld if SAVE_ZOO else None, results_db, CROSS_SURFACE)
+else:
+    # restructure the data from the data files into seperate files, in subject/condition folders. The archives are
+    # read without extracting them.
+    with track_memory('outdoor2zoo'):
+        outdoor2zoo(fld, data_files=data_files)
+
+# %% Step 2: Non-linear dynamics analysis
+if not DIRECT:
+    # prepare files
+    fl = engine(path=fld, extension=".zoo")
+    fl.sort()
+
+    if DISTRIBUTED:
+        # other machines can join with: python worker.py <data folder>
+        create_queue(fld, fl)
+        print(f'Job queue ready in {fld}')
+        run_worker(fld)
+    else:
+        start_stage('analysis', len(fl))
+        for f in fl:
+            file_path, file_name, ext = fileparts(f)
+            trial_start = time.time()
+
+            # extract the data from file and perform non-linear dynamics analysis on all gait trails
+            data = analyse_trial(grab(f))
+
+            zsave(f, data)
+            if results_db is not None:
+                upsert_results(results_db, extract_results(data, file_name))
+            trial_done('analysis', file_name + ext, time.time() - trial_start)
+        end_stage('analysis')
+
+# %% Step 3: Cross-sample entropy between the surfaces of each subject
+if CROSS_SURFACE and not DIRECT:
+    with track_memory('cross_surface_entropy'):
+        # trials that failed in Step 2 have no Euclidean norm
+        norms = {}
+        for f in fl:
+            data = grab(f)
+            if "Acc_euclidean" in data:
+                norms[tuple(fileparts(f)[1].split('_', 1))] = data["Acc_euclidean"]["line"]
+
+        xsampen = cross_surface_entropy(norms)
+        for f in fl:
+            file_path, file_name, ext = fileparts(f)
+            subject_surface = tuple(file_name.split('_', 1))
+            if subject_surface in xsampen:
+                data = add_cross_surface_events(grab(f), xsampen[subject_surface])
+                zsave(f, data)
+                if results_db is not None:
+                    upsert_results(results_db, extract_results(data, file_name))
 
 # %% Extract events to spreadsheet
-zoo2excel(fld, fld_stats)
+if not DIRECT:
+    with track_memory('zoo2excel'):
+        # the results the workers published do not have the events of Step 3, which are read from the zoo files
+        if DISTRIBUTED and not CROSS_SURFACE:
+            merge_results(fld, fld_stats, results_db)
+        elif results_db is not None:
+            export_csv(results_db, fld_stats)
+        else:
+            zoo2excel(fld, fld_stats)
+
+memory_report(fld_stats)
+progress_report()
+cache_report(since=start_time)
 # %%
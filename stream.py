@@ -0,0 +1,22 @@
+import argparse
+from support_functions import streaming
+
+# Near-real-time feedback on gait smoothness and regularity while a participant is walking. Accelerations are read
+# from a local source, one "x,y,z" sample per line, and the LDLJ, step and stride symmetry and sample entropy are
+# printed as a csv line at a fixed cadence:
+#     python stream.py recording.csv                        follow a file that is being written
+#     some_logger | python stream.py -                      read from a pipe
+#     python stream.py tcp://127.0.0.1:5555                 read from a local socket
+
+parser = argparse.ArgumentParser(description='Analyse a live stream of IMU accelerations.')
+parser.add_argument('source', help='"-" for standard input, tcp://host:port, udp://host:port or a file to follow')
+parser.add_argument('--fs', type=float, default=streaming.SAMPLE_RATE, help='sample rate in Hz')
+parser.add_argument('--window', type=float, default=streaming.WINDOW,
+                    help='seconds of signal for LDLJ and symmetry')
+parser.add_argument('--sampen-window', type=float, default=streaming.SAMPEN_WINDOW,
+                    help='seconds of signal for sample entropy')
+parser.add_argument('--cadence', type=float, default=streaming.CADENCE, help='seconds between updates')
+args = parser.parse_args()
+
+print('time,ldlj,step_symmetry,stride_symmetry,sampen,latency')
+streaming.run_stream(args.source, args.fs, args.window, args.sampen_window, args.cadence)
@@ -1,9 +1,15 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
 import numpy as np
-import numpy.matlib as nmp
 import numpy.polynomial.polynomial as poly
-import scipy.sparse as sp
+from support_functions.delay_embedding import delay_embedding
+from support_functions.embedding_cache import cached_parameters, fallback_parameters, source_trial
 from support_functions.euclidean_norm import euclidean_norm
+from support_functions.memory import estimate_footprint, within_budget
 from support_functions.symmetry import symmetry
+from support_functions.time_budget import MAX_SAMPLES, check_deadline
 
 
 # Some hard coded variables
@@ -12,6 +18,23 @@ from support_functions.symmetry import symmetry
 # Annals of biomedical engineering, 38, 2588-2593.
 WS = 10
 
+# Approximate screening mode, see LyE_R_approximate
+APPROXIMATE = False  # use LyE_R_approximate instead of LyE_R in the pipeline
+APPROX_REFERENCES = 500  # number of reference points whose nearest neighbours are followed
+APPROX_EPS = 0.0  # relative error allowed in the nearest neighbour search, 0 finds the exact nearest neighbours
+APPROX_BOOTSTRAP = 200  # bootstrap resamples of the reference points for the confidence intervals
+APPROX_SEED = 0
+
+CHUNK = 1000  # points per kd-tree query, the time budget is checked between chunks
+
+# Embedding parameters of the last signals, so that the metrics of a trial that embed the same signal estimate them
+# once, see embedding_parameters
+EMBEDDING_CACHE_SIZE = 4
+_EMBEDDING_CACHE = OrderedDict()
+# Time delays of the last signals whose embedding dimension was not estimated within the time budget
+_DELAYS = OrderedDict()
+_EMBEDDING_LOCK = threading.Lock()
+
 
 def LyE_R(data, ch, **kwargs):
     """
@@ -23,6 +46,9 @@ def LyE_R(data, ch, **kwargs):
     Since the code above is from a preprint, the outcomes were internally tested against Matlab's inbuilt Lyapunov
     exponent function
 
+    If the (M x M) matrix of divergences does not fit in the memory budget (see memory.py), the average line
+    divergence is accumulated one matched pair at a time instead.
+
     :param data: dictionary containing all data.
     :param ch: list of strings that provide the names three acceleration direction.
     :param kwargs: "event" provides the last step index. Used as input for the Euclidean
@@ -32,39 +58,86 @@ def LyE_R(data, ch, **kwargs):
     """
     norm = euclidean_norm(data, keys=ch)
 
-    if kwargs:
-        event = kwargs.get("event")
-        norm = norm[:event]
+    event = kwargs.get("event")
+    norm = norm[:event]
 
-    ami = AMI_Stergiou(norm, 30)
     fs = data["zoosystem"]["Video"]["Freq"]
-    tau = int(ami[0][0][0])
-    [dE, dim] = FNN(norm, tau, 12, 15, 2, 1)
+    AveLnDiv = divergence_curve(norm, source_trial(data["zoosystem"]["SourceFile"]))
 
-    X = np.array(norm, ndmin=2)
-    r, c = np.shape(X)
-    if r > c:
-        X = np.copy(X.transpose())
+    # determine the relevant period of the signal. In our case, the stride frequency
+    _, _, d_2, _, _ = symmetry(data, ch, event=event)
 
-    # Checks if a multidimentional array was entered as X.
-    if np.size(X, axis=0) > 1:
-        M = np.shape(X)[1]
-        Y = X
-    else:
-        # Calculate useful size of data
-        N = np.shape(X)[1]
-        M = N - (dim - 1) * tau
+    lds = fit_lds(AveLnDiv, d_2, fs)
 
-        Y = np.zeros((M, dim))
-        for j in range(dim):
-            Y[:, j] = X[:, 0 + j * tau:M + j * tau]
-    # Find nearest neighbors
+    # Ys = poly.polyval(np.arange(1 / fs, L1 / fs, 1 / fs), Ps)
+    # Yl = poly.polyval(np.arange(L2 / fs, ws / fs, 1 / fs), Pl)
+    #
+    # x_as = np.arange(1 / fs, ws / fs, 1 / fs)
+    # plt.plot(x_as, AveLnDiv[:ws - 1])
+    #
+    # plt.plot(np.arange(1 / fs, L1 / fs, 1 / fs), Ys, 'm')
+    # plt.plot(np.arange(L2 / fs, ws / fs, 1 / fs), Yl, 'r')
+    #
+    # figname = f"Subject{data['zoosystem']['subj_no']}_{data['zoosystem']['surface']}"
+    # plt.savefig(f"./Figures/LyE_R/{figname}.jpeg")
+    #
+    # plt.close()
+    # del figname
+    return lds, AveLnDiv
+
+
+def LyE_R_approximate(data, ch, **kwargs):
+    """
+    Estimates the divergence exponents of LyE_R much faster, for screening runs in which trials only need to be ranked
+    roughly. Instead of following the nearest neighbour of every point of the state space, APPROX_REFERENCES evenly
+    spaced reference points are followed. Their nearest neighbours are found with a kd-tree, which may return
+    neighbours up to (1 + APPROX_EPS) times further away than the nearest one. Only the part of the divergence curve
+    that the exponents are fitted to is calculated.
+
+    The uncertainty that comes from following a subset of the points is estimated by bootstrapping the reference
+    points, which gives a 95% confidence interval for each exponent. Trials with wide intervals, or close to a
+    decision threshold, can then be recalculated with LyE_R.
+
+    :param data: dictionary containing all data.
+    :param ch: list of strings that provide the names three acceleration direction.
+    :param kwargs: "event" provides the last step index. Used as input for the Euclidean
+    norm. If left empty, the entire timeseries will be analysed.
+    :return: lds: 1x2 list of floats containing the divergence exponent over 0-0.5*signal period, and from 4-10*period
+    AveLnDiv: the start of the divergence curve, up to the end of the long-term fit.
+    lds_ci: 2x2 list with the lower and upper bound of the 95% confidence interval of each exponent.
+    """
+    norm = euclidean_norm(data, keys=ch)
+
+    event = kwargs.get("event")
+    norm = norm[:event]
 
+    fs = data["zoosystem"]["Video"]["Freq"]
+    AveLnDiv = approximate_divergence_curves(norm, fs, source_trial(data["zoosystem"]["SourceFile"]))
+
+    _, _, d_2, _, _ = symmetry(data, ch, event=event)
+
+    return approximate_lds(AveLnDiv, d_2, fs)
+
+
+def divergence_curve(norm, trial=None):
+    """
+    Calculates the divergence curve of LyE_R of a signal that is already cut to length. The divergence exponents are
+    fitted to it with fit_lds, once the stride time is known.
+
+    :param norm: the Euclidean norm of the three acceleration signals.
+    :param trial: (subject, surface) of the trial, for the cache of the embedding parameters, see embedding_parameters.
+    :return: AveLnDiv: the average log divergence per time step.
+    """
+    tau, dim = embedding_parameters(norm, trial)
+    Y = delay_embedding(norm, dim, tau)
+    M = np.shape(Y)[0]
+
+    # Find nearest neighbors
     IND2 = np.zeros((1, M), dtype=int)
     for i in range(M):
+        check_deadline()
         # Find nearest neighbor.
-        Yinit = nmp.repmat(Y[i], M, 1)
-        Ydiff = (Yinit - Y[0:M, :]) ** 2
+        Ydiff = (Y[i] - Y[0:M, :]) ** 2
         Ydisti = np.sqrt(np.sum(Ydiff, axis=1))
 
         # Exclude points too close based on dominant fsuency.
@@ -75,14 +148,230 @@ def LyE_R(data, ch, **kwargs):
         # find minimum distance point for first pair
         IND2[0, i] = np.argsort(Ydisti)[0]
 
-    out = np.vstack((np.arange(M), np.ndarray.flatten(IND2)))
+    if not within_budget(estimate_footprint("LyE_R", M, np.shape(Y)[1])):
+        AveLnDiv = _ave_ln_div_streaming(Y, IND2, M)
+    else:
+        AveLnDiv = _ave_ln_div(Y, IND2, M)
+
+    return AveLnDiv
+
+
+def divergence_curve_triaxial(lines, norm, trial=None):
+    """
+    Calculates the divergence curve of LyE_R in a state space reconstructed from all acceleration directions instead
+    of from their Euclidean norm, so that the direction of the divergence is not lost. Each direction is embedded
+    with the time delay and embedding dimension of the Euclidean norm, and the embeddings are put side by side (Bruijn
+    et al., 2010, see WS). The nearest neighbours in this higher dimensional state space are found with a kd-tree.
+
+    :param lines: (N x 3) array of the three acceleration signals, already cut to length.
+    :param norm: the Euclidean norm of the three acceleration signals, for the embedding parameters.
+    :param trial: (subject, surface) of the trial, see divergence_curve.
+    :return: AveLnDiv: the average log divergence per time step, see divergence_curve.
+    """
+    tau, dim = embedding_parameters(norm, trial)
+    Y = np.hstack([delay_embedding(lines[:, k], dim, tau) for k in range(np.shape(lines)[1])])
+    M = np.shape(Y)[0]
+
+    IND2 = _nearest_neighbours(Y, tau, np.arange(M))[None, :]
+
+    if not within_budget(estimate_footprint("LyE_R", M, np.shape(Y)[1])):
+        AveLnDiv = _ave_ln_div_streaming(Y, IND2, M)
+    else:
+        AveLnDiv = _ave_ln_div(Y, IND2, M)
+
+    return AveLnDiv
+
+
+def approximate_divergence_curves(norm, fs, trial=None, fallback=False):
+    """
+    Calculates the start of the divergence curve of LyE_R_approximate from APPROX_REFERENCES reference points of a
+    signal that is already cut to length, together with APPROX_BOOTSTRAP bootstrap resamples of the reference points.
+
+    :param norm: the Euclidean norm of the three acceleration signals.
+    :param fs: sample rate in Hz.
+    :param trial: (subject, surface) of the trial, see divergence_curve.
+    :param fallback: bool. True when the exact divergence curve exceeded its time budget, so that the embedding
+    parameters are only estimated again as a last resort, see embedding_parameters.
+    :return: AveLnDiv: (1 + APPROX_BOOTSTRAP) x T array. The first row is the divergence curve of all reference
+    points, the other rows those of the resamples.
+    """
+    tau, dim = embedding_parameters(norm, trial, fallback)
+    Y = delay_embedding(norm, dim, tau)
+    M = np.shape(Y)[0]
+    T = min(round(WS * fs) + 1, M)  # the fits in fit_lds use AveLnDiv up to ws + 1
+    ref = np.unique(np.linspace(0, M - 1, min(APPROX_REFERENCES, M)).astype(int))
+    nearest = _nearest_neighbours(Y, tau, ref, eps=APPROX_EPS)
+
+    # log distance between each pair and its propagated points, NaN where the pair runs past the end of the data
+    steps = np.arange(T)
+    valid = steps[None, :] < np.minimum(M - ref, M - nearest)[:, None]
+    i = np.minimum(ref[:, None] + steps[None, :], M - 1)
+    j = np.minimum(nearest[:, None] + steps[None, :], M - 1)
+    distance = np.sqrt(np.sum((Y[i] - Y[j]) ** 2, axis=2))
+    valid &= distance > 0
+    ln_div = np.where(valid, np.log(np.where(valid, distance, 1)), 0)
+
+    # average over the reference points, and over bootstrap resamples of them at once by weighting
+    rng = np.random.default_rng(APPROX_SEED)
+    weights = np.vstack((np.ones(len(ref)),
+                         rng.multinomial(len(ref), np.full(len(ref), 1 / len(ref)), size=APPROX_BOOTSTRAP)))
+    n_div = weights @ valid
+    AveLnDiv = np.zeros(np.shape(n_div))
+    np.divide(weights @ ln_div, n_div, out=AveLnDiv, where=n_div > 0)
+
+    return AveLnDiv
+
+
+def approximate_lds(AveLnDiv, d_2, fs):
+    """
+    Fits the divergence exponents to the curves of approximate_divergence_curves, with their bootstrap confidence
+    intervals.
+
+    :param AveLnDiv: curves as returned by approximate_divergence_curves.
+    :param d_2: stride time in samples.
+    :param fs: sample rate in Hz.
+    :return: lds, AveLnDiv, lds_ci, see LyE_R_approximate.
+    """
+    lds = fit_lds(AveLnDiv.T, d_2, fs)
+    lds_ci = [np.percentile(np.atleast_1d(l)[1:], [2.5, 97.5]).tolist() for l in lds]
+
+    return [float(np.atleast_1d(l)[0]) for l in lds], AveLnDiv[0], lds_ci
+
+
+# embedded functions
+def embedding_parameters(norm, trial=None, fallback=False):
+    """
+    Estimates the time delay (first minimum of the average mutual information) and the embedding dimension (false
+    nearest neighbours) for the state space reconstruction of a signal.
+
+    The parameters of the last EMBEDDING_CACHE_SIZE signals are kept, so that LyE_R, rqa and the other metrics that
+    embed the same signal only estimate them once, also when they run at the same time on threads, and a fallback
+    after a metric exceeded its time budget reuses them. If a persistent cache is set, the parameters may be taken
+    from earlier trials instead, see embedding_cache.py.
+
+    :param norm: the signal.
+    :param trial: (subject, surface) of the trial, for the persistent cache. None if unknown.
+    :param fallback: bool. True for the fallback of a metric that exceeded its time budget. If the parameters of the
+    signal were not estimated before the time ran out, those of a similar or of all cached trials are used, see
+    fallback_parameters. Only if the persistent cache has none, they are estimated again on the first MAX_SAMPLES
+    samples, with the time delay of the whole signal if that was estimated already. These parameters are not kept
+    for the other metrics.
+    :return: tau: time delay in samples.
+    dim: embedding dimension.
+    """
+    key = hashlib.sha1(np.ascontiguousarray(norm, dtype=float).tobytes()).hexdigest()
+
+    with _EMBEDDING_LOCK:
+        if key not in _EMBEDDING_CACHE and fallback:
+            parameters = fallback_parameters(norm, trial)
+            if parameters is None:
+                tau = _DELAYS[key] if key in _DELAYS else int(AMI_Stergiou(norm[:MAX_SAMPLES], 30)[0][0][0])
+                [dE, dim] = FNN(norm[:MAX_SAMPLES], tau, 12, 15, 2, 1)
+                parameters = tau, dim
+            return parameters
+
+        if key not in _EMBEDDING_CACHE:
+            _EMBEDDING_CACHE[key] = cached_parameters(norm, trial, lambda x: _estimate_embedding_parameters(x, key))
+            if len(_EMBEDDING_CACHE) > EMBEDDING_CACHE_SIZE:
+                _EMBEDDING_CACHE.popitem(last=False)
+
+        return _EMBEDDING_CACHE[key]
 
+
+def _estimate_embedding_parameters(norm, key):
+    """
+    Estimates the embedding parameters, see embedding_parameters. The time delay is kept until the embedding dimension
+    is known, so that it is not estimated again if FNN exceeds the time budget.
+    """
+    if key not in _DELAYS:
+        ami = AMI_Stergiou(norm, 30)
+        _DELAYS[key] = int(ami[0][0][0])
+        if len(_DELAYS) > EMBEDDING_CACHE_SIZE:
+            _DELAYS.popitem(last=False)
+    tau = _DELAYS[key]
+    [dE, dim] = FNN(norm, tau, 12, 15, 2, 1)
+    del _DELAYS[key]
+
+    return tau, dim
+
+
+def fit_lds(AveLnDiv, d_2, fs):
+    """
+    Fits the short-term (0-0.5 stride) and long-term (4-10 strides) divergence exponents to the divergence curve.
+
+    :param AveLnDiv: divergence curve, or a (T x B) array with B curves that are fitted at once.
+    :param d_2: time delay of the second dominant peak of the autocorrelation, i.e. the stride time in samples.
+    :param fs: sample rate in Hz.
+    :return: lds: [short-term, long-term] divergence exponent. NaN if the curve is too short for the long-term fit.
+    """
+    period = d_2 / fs
+    ws = round(WS * fs)
+    # find the least square fit
+    L1 = int(0.5 * period * fs)
+
+    # np.arange(1 / fs, L1, 1 / fs)
+    # Ps = poly.polyfit(np.arange(1 / fs, L1 / fs, 1 / fs), AveLnDiv[1:L1], 1)
+    Ps = poly.polyfit(np.arange(1 / fs, L1 / fs, 1 / fs), AveLnDiv[1:L1], 1)
+    Pl = [np.nan, np.nan]
+    if ws > 4 * period * fs:
+        L2 = int(4 * period * fs)
+
+        if len(np.arange(L2 / fs, ws / fs, 1 / fs)) == len(AveLnDiv[L2:ws]):
+            Pl = poly.polyfit(np.arange(L2 / fs, ws / fs, 1 / fs), AveLnDiv[L2:ws], 1)
+        elif len(np.arange(L2 / fs, ws / fs, 1 / fs)) - len(AveLnDiv[L2:ws]) == 1:
+            Pl = poly.polyfit(np.arange(L2 / fs, ws / fs, 1 / fs), AveLnDiv[L2:ws + 1], 1)
+
+    return [Ps[1], Pl[1]]
+
+
+def _nearest_neighbours(Y, tau, points, eps=0.0):
+    """
+    Finds the nearest neighbour of points of the state space with a kd-tree, excluding the points too close in time,
+    with the same window as LyE_R.
+
+    :param Y: (M x dim) embedded signal.
+    :param tau: time delay in samples.
+    :param points: indices of the points.
+    :param eps: relative error allowed, neighbours may be up to (1 + eps) times further away than the nearest one.
+    :return: index of the nearest neighbour of each point.
+    """
+    from scipy.spatial import cKDTree
+
+    M = np.shape(Y)[0]
+    lower = np.round(points - tau * 0.8).astype(int)
+    upper = np.round(points + 1 + tau * 0.8).astype(int) - 1
+    # the k nearest points always include a point outside the exclusion window if k exceeds the window length
+    k = min(int(np.max(upper - lower)) + 2, M)
+    tree = cKDTree(Y)
+
+    nearest = np.zeros(len(points), dtype=int)
+    for start in range(0, len(points), CHUNK):
+        check_deadline()
+        chunk = slice(start, start + CHUNK)
+        _, neighbours = tree.query(Y[points[chunk]], k=k, eps=eps)
+        neighbours = np.reshape(neighbours, (len(points[chunk]), k))
+        excluded = (neighbours >= lower[chunk, None]) & (neighbours <= upper[chunk, None])
+        nearest[chunk] = neighbours[np.arange(len(neighbours)), np.argmax(~excluded, axis=1)]
+
+    return nearest
+
+
+def _ave_ln_div(Y, IND2, M):
+    """
+    Calculates the average line divergence of the matched pairs from the full (M x M) matrix of distances.
+
+    :param Y: (M x dim) embedded signal.
+    :param IND2: (1 x M) index of the nearest neighbour of each point.
+    :param M: number of embedded points.
+    :return: AveLnDiv: the average log divergence per time step.
+    """
     # Calculate distances between matched pairs.
     DM = np.zeros((M, M))
 
     IND2len = np.shape(IND2)[1]
 
     for i in range(IND2len):
+        check_deadline()
         # The data can only be propagated so far from the matched pair.
         EndITL = M - IND2[:, i][0]
         if (M - IND2[:, i][0]) > (M - i):
@@ -99,58 +388,43 @@ def LyE_R(data, ch, **kwargs):
     AveLnDiv = np.zeros(len(DM))
     # NOTE: MATLAB version does not preallocate AveLnDiv, we could preallocate that.
     for i in range(r):
+        check_deadline()
         distanceM = DM[i, :]
         if np.sum(distanceM) != 0:
             AveLnDiv[i] = np.mean(np.log(distanceM[distanceM > 0]))
 
-    out = np.vstack((out, AveLnDiv))
-    AveLnDiv = AveLnDiv
+    return AveLnDiv
 
 
-    # determine the relevant period of the signal. In our case, the stride frequency
-    _, _, d_2, _, _ = symmetry(data, ch, event=event)
+def _ave_ln_div_streaming(Y, IND2, M):
+    """
+    Calculates the same average line divergence as _ave_ln_div, but keeps a running sum and count of the log
+    distances per time step instead of the (M x M) matrix of distances.
 
-    period = d_2 / fs
-    ws = round(WS * fs)
-    # find the least square fit
-    L1 = int(0.5 * period * fs)
-    L1 = L1
+    :param Y: (M x dim) embedded signal.
+    :param IND2: (1 x M) index of the nearest neighbour of each point.
+    :param M: number of embedded points.
+    :return: AveLnDiv: the average log divergence per time step.
+    """
+    sum_ln_div = np.zeros(M)
+    n_div = np.zeros(M, dtype=int)
 
-    # np.arange(1 / fs, L1, 1 / fs)
-    # Ps = poly.polyfit(np.arange(1 / fs, L1 / fs, 1 / fs), AveLnDiv[1:L1], 1)
-    np.arange(1 / fs, L1, 1 / fs)
-    Ps = poly.polyfit(np.arange(1 / fs, L1 / fs, 1 / fs), AveLnDiv[1:L1], 1)
-    if ws > 4 * period * fs:
-        L2 = int(4 * period * fs)
-        L2 = L2
+    for i in range(np.shape(IND2)[1]):
+        check_deadline()
+        j = IND2[0, i]
+        EndITL = min(M - j, M - i)
 
-        if len(np.arange(L2 / fs, ws / fs, 1 / fs)) == len(AveLnDiv[L2:ws]):
-            Pl = poly.polyfit(np.arange(L2 / fs, ws / fs, 1 / fs), AveLnDiv[L2:ws], 1)
-        elif len(np.arange(L2 / fs, ws / fs, 1 / fs)) - len(AveLnDiv[L2:ws]) == 1:
-            Pl = poly.polyfit(np.arange(L2 / fs, ws / fs, 1 / fs), AveLnDiv[L2:ws + 1], 1)
-        else:
-            Pl = [np.nan, np.nan]
+        distance = np.sqrt(np.sum((Y[i:EndITL + i, :] - Y[j:EndITL + j, :]) ** 2, axis=1))
+        positive = distance > 0
+        sum_ln_div[:EndITL][positive] += np.log(distance[positive])
+        n_div[:EndITL] += positive
 
-    lds = [Ps[1], Pl[1]]
+    AveLnDiv = np.zeros(M)
+    np.divide(sum_ln_div, n_div, out=AveLnDiv, where=n_div > 0)
 
-    # Ys = poly.polyval(np.arange(1 / fs, L1 / fs, 1 / fs), Ps)
-    # Yl = poly.polyval(np.arange(L2 / fs, ws / fs, 1 / fs), Pl)
-    #
-    # x_as = np.arange(1 / fs, ws / fs, 1 / fs)
-    # plt.plot(x_as, AveLnDiv[:ws - 1])
-    #
-    # plt.plot(np.arange(1 / fs, L1 / fs, 1 / fs), Ys, 'm')
-    # plt.plot(np.arange(L2 / fs, ws / fs, 1 / fs), Yl, 'r')
-    #
-    # figname = f"Subject{data['zoosystem']['subj_no']}_{data['zoosystem']['surface']}"
-    # plt.savefig(f"./Figures/LyE_R/{figname}.jpeg")
-    #
-    # plt.close()
-    # del figname
-    return lds, AveLnDiv
+    return AveLnDiv
 
 
-# embedded functions
 def AMI_Stergiou(data, L, to_matlab=False, n_bins=0):
     """
     inputs    - data, column oriented time series
@@ -227,6 +501,8 @@ def AMI_Stergiou(data, L, to_matlab=False, n_bins=0):
     NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
     SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
     """
+    import scipy.sparse as sp
+
     eps = np.finfo(float).eps  # smallest floating point value
 
     if isinstance(L, int):
@@ -385,8 +661,10 @@ def FNN(data, tau, MaxDim, Rtol, Atol, speed):
     data_array = np.array(data)
     RA = np.std(data_array)
 
-    z = np.array([data_array[0:n]])
-    y = np.array([[]])
+    # One copy of the delay embedding up to MaxDim + 1, with a row per delay. At dimension j, y is the view on the
+    # first j + 1 rows and z on the next row. kd_part partitions y and z in place, so the rows that are stacked into y
+    # at the next dimension are the partitioned ones, as they were when y was grown with np.vstack.
+    embedding = np.array(delay_embedding(data_array, MaxDim + 1, tau).T)
 
     m_search = 2
 
@@ -396,17 +674,14 @@ def FNN(data, tau, MaxDim, Rtol, Atol, speed):
     dE = np.zeros((MaxDim, 1))
 
     for j in range(MaxDim):
-        # y = np.array([y,z]) # adds additional dimension
-        if j == 0:
-            y = np.array([np.append(y, z)])
-        else:
-            y = np.array(np.vstack([y, z]))
-        z = np.array([data_array[tau * (j + 1):n + tau * (j + 1)]])
+        y = embedding[:j + 1]  # adds additional dimension
+        z = embedding[j + 1:j + 2]
         L = np.zeros((n))
 
         (y_model, z_model, sort_list, node_list) = kd_part(y, z, 512)
 
         for i in range(len(indx)):
+            check_deadline()
             yq = np.array(y[:, indx[i]])  # set up next point to look at
 
             b_upper = np.inf * np.ones(np.size(yq))
@@ -8,7 +8,7 @@ def addchannel_data(data, ch, ndata, section):
     Arguments:
     data -- dict. The zoo data structure.
     ch -- str. The name of the new channel to add.
-    ndata -- list or numpy array. The data to add to the new channel.
+    ndata -- list or numpy array. The data to add to the new channel. It is stored as a numpy array.
     section -- str. 'Video' or 'Analog' section.
 
     Returns:
@@ -20,11 +20,8 @@ def addchannel_data(data, ch, ndata, section):
         ch = ch[0]
 
     # Validate the shape of ndata
-    if isinstance(ndata, np.ndarray):
-        _, c = ndata.shape if ndata.ndim > 1 else (ndata.shape[0], 1)
-    else:
-        ndata = np.array(ndata)
-        _, c = ndata.shape if ndata.ndim > 1 else (len(ndata), 1)
+    ndata = np.asarray(ndata)
+    _, c = ndata.shape if ndata.ndim > 1 else (ndata.shape[0], 1)
 
     if c > 3:
         raise ValueError('ndata must be nx1 or nx3')
@@ -41,7 +38,7 @@ def addchannel_data(data, ch, ndata, section):
 
     # Add channel to the zoo structure
     data[ch] = {
-        'line': ndata.tolist(),
+        'line': ndata,
         'event': {}
     }
 
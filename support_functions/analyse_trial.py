@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from support_functions.add_channel import addchannel_data
+from support_functions.embedding_cache import source_trial
+from support_functions.euclidean_norm import euclidean_norm
+from support_functions.fork_context import fork_context
+from support_functions.memory import track_memory
+from support_functions import time_budget, progress
+from support_functions.time_budget import run_with_budget
+
+# the non-linear analysis metrics
+from support_functions.registry import METRICS, selected_metrics
+
+# Some hardcoded values
+CHANNELS = ["Acc_x", "Acc_y", "Acc_z"]
+GYRO_CHANNELS = ["Gyr_x", "Gyr_y", "Gyr_z"]
+# Run the metrics of a trial at the same time, see analyse_metrics. None runs them one after another, "thread" on a
+# thread pool and "process" on a pool of forked processes, which is only available on Linux.
+CONCURRENT = None
+MAX_WORKERS = 4
+
+
+def analyse_trial(data, channels=None, metrics=None):
+    """
+    Performs the non-linear dynamics analysis (Step 2 of main.py) on a single gait trial. The metrics and the
+    channels and events they add are defined in registry.py. The Euclidean norm is added as a channel as well. If the
+    trial has angular velocity channels (6-axis IMU), the LDLJ is corrected with them. If LyE.APPROXIMATE is set, the
+    divergence exponents are estimated with LyE_R_approximate and their confidence intervals are added as events.
+
+    Each metric runs within its time budget, see time_budget.py. If budgets are set, the time each metric took and
+    the fallback it needed are stored in the zoosystem under "TimeBudget".
+
+    :param data: dictionary containing all data of the trial, as read with grab.
+    :param channels: list of strings that provide the names three acceleration directions. Default is CHANNELS.
+    :param metrics: list of the names of the metrics to calculate. Default is registry.SELECTED, all metrics if not set.
+    :return: data: the dictionary with the channels and events added.
+    """
+    if channels is None:
+        channels = CHANNELS
+
+    last_step_index = data["Acc_x"]["event"]["FS1"][0]
+    inputs = {
+        "norm": euclidean_norm(data, keys=channels)[:last_step_index],
+        "lines": np.column_stack([data[ch]["line"] for ch in channels])[:last_step_index],
+        "fs": data["zoosystem"]["Video"]["Freq"],
+        "data": data,
+        "channels": channels,
+        "last_step_index": last_step_index,
+        "gyro": GYRO_CHANNELS if all(ch in data for ch in GYRO_CHANNELS) else None,
+        "trial": source_trial(data["zoosystem"]["SourceFile"]),
+    }
+
+    # perform non-linear dynamics analysis on all gait trails
+    metrics = selected_metrics(metrics)
+    results = analyse_metrics(metrics, inputs)
+    for metric, (_, record) in results.items():
+        progress.metric_done(metric, record["seconds"])
+
+    # add channels and events
+    addchannel_data(data, "Acc_euclidean", inputs["norm"], "video")
+    for metric in metrics:
+        result, record = results[metric]
+        required = {m: results[m][0] for m in METRICS[metric]["requires"]}
+        new_channels, events = METRICS[metric]["outputs"](result, record, required, inputs["fs"])
+
+        for ch, line in new_channels.items():
+            addchannel_data(data, ch, line, "Video")
+        for ch, ch_events in events.items():
+            data[ch]["event"].update(ch_events)
+
+    if time_budget.TIME_BUDGETS:
+        data["zoosystem"]["TimeBudget"] = {
+            "budgets": dict(time_budget.TIME_BUDGETS),
+            "metrics": {metric: record for metric, (_, record) in results.items()}
+        }
+
+    return data
+
+
+def analyse_metrics(metrics, inputs):
+    """
+    Runs the tasks of the metrics of a single trial, each within its time budget. The inputs, such as the Euclidean
+    norm, are calculated once and shared by all tasks.
+
+    If CONCURRENT is set, the tasks run at the same time on a pool of MAX_WORKERS threads or processes, to reduce the
+    time for one long recording to about that of the slowest metric. With CONCURRENT = "process", the processes are
+    forked, so that they keep the settings main.py made, such as the time budgets, the selected metrics and the
+    embedding cache, and do not import and run main.py again. This is only possible where fork is the default start
+    method, see fork_context, elsewhere a ValueError is raised.
+
+    :param metrics: list of the names of the metrics in registry.METRICS.
+    :param inputs: dict with the registry.INPUTS of the trial.
+    :return: dict. Per metric, the result of its task (None if it was skipped) and the record of run_with_budget.
+    """
+    tasks = {metric: (METRICS[metric]["task"], tuple(inputs[i] for i in METRICS[metric]["inputs"]))
+             for metric in metrics}
+
+    if not CONCURRENT:
+        results = {}
+        for metric, (task, args) in tasks.items():
+            with track_memory(metric):
+                results[metric] = run_with_budget(metric, task, args)
+        return results
+
+    if CONCURRENT not in ("thread", "process"):
+        raise ValueError('CONCURRENT must be None, "thread" or "process", not {0!r}'.format(CONCURRENT))
+
+    if CONCURRENT == "thread":
+        pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    else:
+        context = fork_context()
+        if context is None:
+            raise ValueError('CONCURRENT = "process" needs forked processes, which are only safe on Linux, '
+                             'use CONCURRENT = "thread" instead')
+        pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=context)
+
+    with track_memory('metrics'), pool as executor:
+        futures = {metric: executor.submit(run_with_budget, metric, task, args)
+                   for metric, (task, args) in tasks.items()}
+        return {metric: future.result() for metric, future in futures.items()}
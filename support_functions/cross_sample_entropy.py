@@ -0,0 +1,97 @@
+import numpy as np
+
+from support_functions.delay_embedding import delay_embedding
+from support_functions.range_count import range_count, kd_tree
+from support_functions.sample_entropy import TOL, DIM
+
+# Some hardcoded values
+EVENT_PREFIX = "xsampen_"  # events named EVENT_PREFIX + the name of the other signal, e.g. xsampen_Acc_y
+
+
+def cross_sample_entropy(u, v):
+    """
+    Calculates the cross-sample entropy of two signals, i.e. how often the templates of one signal match those of
+    the other. Low values mean that the signals are coupled or similar. Both signals are normalised to unit variance,
+    with a tolerance of TOL and a dimension of DIM, as in sample_entropy. The signals may differ in length.
+
+    Richman, J. S., & Moorman, J. R. (2000). Physiological time-series analysis using approximate entropy and sample
+    entropy. American Journal of Physiology-Heart and Circulatory Physiology, 278(6), H2039-H2049.
+
+    :param u: first signal.
+    :param v: second signal.
+    :return: xsampen; a single float. NaN if no templates of length DIM + 1 match.
+    """
+    return cross_sample_entropy_pairs([u, v], [(0, 1)])[0]
+
+
+def cross_sample_entropy_pairs(signals, pairs):
+    """
+    Calculates the cross-sample entropy of many pairs of signals at once, e.g. all pairs of acceleration directions or
+    all pairs of trials of a subject. The templates and kd-trees of each signal are built once and reused by every
+    pair it is in, see range_count.
+
+    :param signals: list of signals.
+    :param pairs: list of (i, j) indices into signals.
+    :return: list of floats, the cross-sample entropy of each pair, see cross_sample_entropy.
+    """
+    templates = {}
+    for i in sorted({i for pair in pairs for i in pair}):
+        templates[i] = _templates(signals[i])
+
+    xsampen = []
+    for i, j in pairs:
+        (u_m, u_m1), (tree_m, tree_m1) = templates[i][0], templates[j][1]
+        B = range_count(u_m, TOL, tree_m)
+        A = range_count(u_m1, TOL, tree_m1)
+        xsampen.append(-np.log(A / B) if A > 0 else np.nan)
+
+    return xsampen
+
+
+def cross_surface_entropy(trials):
+    """
+    Calculates the cross-sample entropy of each pair of surfaces of each subject, to quantify how similar the gait of
+    a subject is across surfaces.
+
+    :param trials: dict. (subject, surface) -> signal of the trial, e.g. the Euclidean norm.
+    :return: dict. (subject, surface) -> {other surface: cross-sample entropy}.
+    """
+    keys = list(trials)
+    pairs = [(a, b) for a in range(len(keys)) for b in range(a + 1, len(keys)) if keys[a][0] == keys[b][0]]
+    xsampen = cross_sample_entropy_pairs([trials[k] for k in keys], pairs)
+
+    # the number of matching templates is the same both ways round, so each pair is calculated once
+    results = {k: {} for k in keys}
+    for (a, b), value in zip(pairs, xsampen):
+        results[keys[a]][keys[b][1]] = value
+        results[keys[b]][keys[a][1]] = value
+
+    return results
+
+
+def add_cross_surface_events(data, xsampen):
+    """
+    Adds the cross-sample entropy of a trial with the other surfaces of the subject as events of the Euclidean norm,
+    which zoo2excel writes to the CrossSampleEntropy_<surface> columns.
+
+    :param data: dictionary containing all data of the trial, analysed with analyse_trial.
+    :param xsampen: dict. Other surface -> cross-sample entropy, as returned by cross_surface_entropy for the trial.
+    :return: data: the dictionary with the events added.
+    """
+    data["Acc_euclidean"]["event"].update({EVENT_PREFIX + other: [value, 0, 0] for other, value in xsampen.items()})
+
+    return data
+
+
+# embedded functions
+def _templates(signal):
+    """
+    :param signal: a signal.
+    :return: the (N - DIM) templates of length DIM and DIM + 1 of the normalised signal, and their kd-trees.
+    """
+    x = np.asarray(signal, dtype=float)
+    x = (x - np.mean(x)) / np.std(x)
+    embedded = delay_embedding(x, DIM + 1)
+    t_m, t_m1 = embedded[:, :DIM], embedded
+
+    return (t_m, t_m1), (kd_tree(t_m), kd_tree(t_m1))
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def delay_embedding(x, dim, tau=1):
+    """
+    Reconstructs the state space of a signal with time delays, as a read-only view on the signal. Row i holds
+    x[i], x[i + tau], ..., x[i + (dim - 1) * tau], so no data is copied, whatever dim and tau are. Operations on the
+    view (slicing, differences, comparisons) read the signal directly. Code that has to modify the embedding must
+    copy it first, e.g. with np.array.
+
+    :param x: 1-D signal, e.g. the Euclidean norm.
+    :param dim: embedding dimension, or template length for sample entropy.
+    :param tau: time delay in samples.
+    :return: (M x dim) view on x, with M = N - (dim - 1) * tau.
+    """
+    x = np.asarray(x, dtype=float)
+    span = (dim - 1) * tau + 1
+    if x.ndim != 1 or len(x) < span:
+        raise ValueError('cannot embed a signal of shape {0} with dim={1} and tau={2}'.format(x.shape, dim, tau))
+
+    return np.lib.stride_tricks.sliding_window_view(x, span)[:, ::tau]
@@ -0,0 +1,65 @@
+import numpy as np
+
+from support_functions.time_budget import check_deadline
+
+# Some hardcoded values
+# Peng, C. K., Havlin, S., Stanley, H. E., & Goldberger, A. L. (1995). Quantification of scaling exponents and
+# crossover phenomena in nonstationary heartbeat time series. Chaos, 5(1), 82-87.
+ORDER = 1  # order of the polynomial trend removed from each window
+MIN_SCALE = 4  # smallest window, in samples
+MAX_SCALE_DIVISOR = 4  # largest window is the signal length divided by this
+N_SCALES = 20  # logarithmically spaced window sizes, fewer for short signals
+
+
+def dfa(x, scales=None, order=ORDER):
+    """
+    Detrended fluctuation analysis of a signal, e.g. the Euclidean norm of the accelerations or a series of stride
+    times. The signal is integrated once, the integrated signal is cut into windows of each size, and the fluctuation
+    around the polynomial trend of each window is averaged. alpha is the slope of the log fluctuation against the log
+    window size: 0.5 for uncorrelated noise, above 0.5 for persistent long-range correlation.
+
+    The windows of one size are reshaped views on the integrated signal, and their trends are all fitted with a
+    single matrix product. The windows are taken from the start and from the end of the signal, so that no samples
+    are left out (Kantelhardt et al., 2001).
+
+    :param x: the signal.
+    :param scales: window sizes in samples. Default is N_SCALES sizes from MIN_SCALE to a quarter of the signal length.
+    :param order: order of the polynomial trend. Default is ORDER.
+    :return: alpha; a single float, the scaling exponent.
+            scales; the window sizes in samples.
+            fluctuation; the fluctuation of each window size.
+    """
+    x = np.asarray(x, dtype=float)
+    N = len(x)
+    if scales is None:
+        scales = dfa_scales(N)
+    scales = np.asarray(scales, dtype=int)
+    if len(scales) < 2 or scales[0] <= order + 1 or scales[-1] > N:
+        raise ValueError('dfa needs at least two window sizes of more than order + 1 samples, within the signal length')
+
+    # integrate once
+    profile = np.cumsum(x - np.mean(x))
+
+    fluctuation = np.zeros(len(scales))
+    for k, n in enumerate(scales):
+        check_deadline()
+        n_windows = N // n
+        windows = np.vstack((profile[:n_windows * n].reshape(n_windows, n),
+                             profile[N - n_windows * n:].reshape(n_windows, n)))
+
+        # least squares fit of the trend of all windows at once
+        t = np.vander(np.arange(n, dtype=float), order + 1)
+        trend = windows @ np.linalg.pinv(t).T @ t.T
+        fluctuation[k] = np.sqrt(np.mean((windows - trend) ** 2))
+
+    alpha = np.polyfit(np.log(scales), np.log(fluctuation), 1)[0]
+
+    return alpha, scales, fluctuation
+
+
+def dfa_scales(N):
+    """
+    :param N: signal length.
+    :return: up to N_SCALES logarithmically spaced window sizes in samples, from MIN_SCALE to N / MAX_SCALE_DIVISOR.
+    """
+    return np.unique(np.round(np.geomspace(MIN_SCALE, max(N // MAX_SCALE_DIVISOR, MIN_SCALE), N_SCALES)).astype(int))
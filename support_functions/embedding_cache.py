@@ -0,0 +1,199 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# Some hardcoded values
+# SQLite file that keeps the embedding parameters (tau, dim) of LyE_R and the metrics in its state space, so that they
+# do not need to be estimated for every trial, see set_embedding_cache. None estimates them for every trial.
+CACHE_FILE = None
+# How the cache is used:
+#   "estimate"  always estimate the parameters, and add them to the cache
+#   "reuse"     reuse the parameters of a similar trial of the same subject and surface, or estimate them
+#   "cohort"    fix the parameters to the median of the cache once it has COHORT_MIN_TRIALS trials
+POLICY = "reuse"
+POLICIES = ["estimate", "reuse", "cohort"]
+SIMILARITY = 0.1  # largest relative difference in length, mean, standard deviation and period of similar trials
+COHORT_MIN_TRIALS = 5
+TIMEOUT = 60  # seconds to wait for the database lock
+
+
+def set_embedding_cache(cache_file, policy=None):
+    """
+    Sets the cache of the embedding parameters that embedding_parameters in LyE.py uses.
+
+    :param cache_file: str. Full path to the SQLite file, created if it does not exist. None disables the cache.
+    :param policy: str. "estimate", "reuse" or "cohort", see POLICY. Default keeps the current POLICY.
+    :return: None
+    """
+    global CACHE_FILE, POLICY
+    if policy is not None:
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of {0}, not {1!r}'.format(', '.join(POLICIES), policy))
+        POLICY = policy
+    CACHE_FILE = cache_file
+
+
+def cached_parameters(norm, trial, estimate):
+    """
+    Looks up the embedding parameters of a signal in the cache as set by POLICY, or estimates them and adds them to
+    the cache. Every lookup is logged in the cache, so that cache_report can report the hit and miss rates of all
+    processes and machines that share it.
+
+    :param norm: the signal, already cut to length.
+    :param trial: (subject, surface) of the trial, see source_trial, or None if unknown.
+    :param estimate: function that estimates (tau, dim) from the signal.
+    :return: tau: time delay in samples.
+    dim: embedding dimension.
+    """
+    if CACHE_FILE is None:
+        return estimate(norm)
+
+    subject, surface = trial if trial is not None else ("", "")
+    key, features = fingerprint(norm)
+
+    conn = _connect(CACHE_FILE)
+    try:
+        parameters = None
+        if POLICY == "reuse":
+            parameters = _similar(conn, key, features, subject, surface)
+        elif POLICY == "cohort":
+            parameters = _cohort(conn)
+
+        hit = parameters is not None
+        if not hit:
+            parameters = estimate(norm)
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO embedding VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (key, subject, surface) + tuple(features) + tuple(int(p) for p in parameters)
+                             + (time.time(),))
+        with conn:
+            conn.execute("INSERT INTO lookups VALUES (?, ?, ?, ?, ?)", (time.time(), subject, surface, POLICY, hit))
+    finally:
+        conn.close()
+
+    return parameters
+
+
+def fallback_parameters(norm, trial):
+    """
+    Looks up embedding parameters for a trial whose own estimate did not finish within its time budget, whatever the
+    POLICY: those of the same or a similar trial of the same subject and surface, or else the median of all cached
+    trials. The lookup is logged with the policy "fallback".
+
+    :param norm: the signal, already cut to length.
+    :param trial: (subject, surface) of the trial, see source_trial, or None if unknown.
+    :return: (tau, dim), or None if the cache is disabled or empty.
+    """
+    if CACHE_FILE is None:
+        return None
+
+    subject, surface = trial if trial is not None else ("", "")
+    key, features = fingerprint(norm)
+
+    conn = _connect(CACHE_FILE)
+    try:
+        parameters = _similar(conn, key, features, subject, surface)
+        if parameters is None:
+            parameters = _cohort(conn, min_trials=1)
+        with conn:
+            conn.execute("INSERT INTO lookups VALUES (?, ?, ?, ?, ?)",
+                         (time.time(), subject, surface, "fallback", parameters is not None))
+    finally:
+        conn.close()
+
+    return parameters
+
+
+def fingerprint(norm):
+    """
+    :param norm: the signal.
+    :return: key: str. Hash of the samples, the same only for the same signal.
+    features: [length, mean, standard deviation, period of the dominant frequency in samples], to find similar signals.
+    """
+    norm = np.ascontiguousarray(norm, dtype=float)
+    spectrum = np.abs(np.fft.rfft(norm - np.mean(norm)))
+    peak = int(np.argmax(spectrum[1:])) + 1 if len(spectrum) > 1 else 0
+    period = len(norm) / peak if peak else 0.0
+
+    return hashlib.sha1(norm.tobytes()).hexdigest(), [len(norm), float(np.mean(norm)), float(np.std(norm)), period]
+
+
+def source_trial(source_file):
+    """
+    :param source_file: str. Name of the zoo file of a trial, e.g. S01_grass.zoo, as in the zoosystem.
+    :return: (subject, surface) of the trial.
+    """
+    name = os.path.splitext(os.path.basename(str(source_file)))[0]
+    subject, _, surface = name.partition('_')
+    return subject, surface
+
+
+def cache_report(since=None):
+    """
+    Prints the hit and miss rates of the cache.
+
+    :param since: float. Only count lookups from this time on (time.time()), e.g. the start of the run. Default counts
+    all lookups.
+    :return: dict. Number of "hits" and "misses", or None if the cache is disabled.
+    """
+    if CACHE_FILE is None:
+        return None
+
+    conn = _connect(CACHE_FILE)
+    hits, lookups = conn.execute("SELECT COALESCE(SUM(hit), 0), COUNT(*) FROM lookups WHERE time >= ?",
+                                 (since or 0,)).fetchone()
+    n_cached = conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+    conn.close()
+
+    print('Embedding parameter cache ({0}): {1} hits, {2} misses{3}, {4} trials cached'.format(
+        POLICY, hits, lookups - hits, ' ({0:.0%} hit rate)'.format(hits / lookups) if lookups else '', n_cached))
+    return {"hits": hits, "misses": lookups - hits}
+
+
+# embedded functions
+def _connect(cache_file):
+    """
+    Opens the cache, and creates it if it does not exist yet.
+    """
+    conn = sqlite3.connect(cache_file, timeout=TIMEOUT)
+    conn.execute("CREATE TABLE IF NOT EXISTS embedding ("
+                 "fingerprint TEXT PRIMARY KEY, subject TEXT, surface TEXT, "
+                 "n INTEGER, mean REAL, std REAL, period REAL, tau INTEGER, dim INTEGER, created REAL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS embedding_trial ON embedding (subject, surface)")
+    conn.execute("CREATE TABLE IF NOT EXISTS lookups (time REAL, subject TEXT, surface TEXT, policy TEXT, hit INTEGER)")
+    conn.commit()
+    return conn
+
+
+def _similar(conn, key, features, subject, surface):
+    """
+    :return: (tau, dim) of the same signal, or of the most similar signal of the same subject and surface within
+    SIMILARITY, or None.
+    """
+    row = conn.execute("SELECT tau, dim FROM embedding WHERE fingerprint = ?", (key,)).fetchone()
+    if row is not None:
+        return row
+
+    rows = conn.execute("SELECT n, mean, std, period, tau, dim FROM embedding WHERE subject = ? AND surface = ?",
+                        (subject, surface)).fetchall()
+    if not rows:
+        return None
+
+    cached = np.array([r[:4] for r in rows], dtype=float)
+    difference = np.max(np.abs(cached - features) / np.maximum(np.abs(cached), np.finfo(float).tiny), axis=1)
+    best = int(np.argmin(difference))
+    return rows[best][4:] if difference[best] <= SIMILARITY else None
+
+
+def _cohort(conn, min_trials=COHORT_MIN_TRIALS):
+    """
+    :return: median (tau, dim) of the cached trials, or None if there are fewer than min_trials.
+    """
+    rows = conn.execute("SELECT tau, dim FROM embedding").fetchall()
+    if len(rows) < max(min_trials, 1):
+        return None
+    tau, dim = np.median(np.array(rows), axis=0)
+    return int(round(tau)), int(round(dim))
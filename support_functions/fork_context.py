@@ -0,0 +1,17 @@
+import multiprocessing
+import sys
+
+
+def fork_context():
+    """
+    Returns the multiprocessing context to start worker processes with, if they can safely be forked from this
+    process. Forked workers share the memory of this process, so the data does not need to be sent to them, and they
+    keep the settings that main.py made in the modules. Forking is only safe where it is the default start method of
+    the platform, i.e. Linux. On macOS fork is available, but unsafe, which is why Python spawns processes there, and
+    Windows can not fork.
+
+    :return: multiprocessing context, or None if the work should run in this process.
+    """
+    if sys.platform.startswith('linux') and 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
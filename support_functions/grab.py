@@ -1,14 +1,34 @@
+import base64
 import json
+import numpy as np
 
 
 def grab(fl):
     """
-    Grabs the data that is in the folders
+    Grabs the data that is in the folders. Channels are returned as numpy arrays, both from files written by zsave
+    and from older files that store them as lists.
     :param fl: str full path to file
     :return:
     """
     with open(fl, "r") as f:
-        r = json.load(f)
+        r = json.load(f, object_hook=decode_array)
+
+    for ch in r:
+        if ch != 'zoosystem' and isinstance(r[ch], dict) and isinstance(r[ch].get('line'), list):
+            r[ch]['line'] = np.array(r[ch]['line'])
 
     return r
 
+
+def decode_array(obj):
+    """
+    Decodes the numpy arrays that zsave encoded, see zsave.encode_array. Other objects are returned as they are.
+    :param obj: dict read by json.load
+    :return:
+    """
+    if '__ndarray__' in obj:
+        # bytearray, so that the array is writable
+        buffer = bytearray(base64.b64decode(obj['__ndarray__']))
+        return np.frombuffer(buffer, dtype=np.dtype(obj['dtype'])).reshape(obj['shape'])
+
+    return obj
@@ -0,0 +1,304 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from support_functions.analyse_trial import analyse_trial
+from support_functions.fileparts import fileparts
+from support_functions.grab import grab
+from support_functions.results_db import parameter_set, upsert_results, export_csv
+from support_functions.zoo2excel import extract_results, write_results
+from support_functions.zsave import zsave
+from support_functions import LyE, embedding_cache, memory, progress, registry, resample, time_budget
+
+# Some hardcoded values
+QUEUE_NAME = 'jobs.sqlite'  # created in the data folder, which all machines share
+LEASE = 30 * 60  # seconds a worker may hold a trial without renewing the lease
+MAX_ATTEMPTS = 3  # a trial is marked as failed after this many attempts
+POLL = 10  # seconds between polls while other workers still hold leases
+TIMEOUT = 60  # seconds to wait for the database lock
+
+
+def connect(db):
+    """
+    Opens the job queue. The queue is a single SQLite file on the shared filesystem, so no broker is needed. SQLite
+    relies on the file locks of the filesystem, which NFS and SMB support when locking is enabled on the mount. The
+    default rollback journal is kept, since write-ahead logging does not work over a network filesystem.
+
+    :param db: str. Full path to the queue file.
+    :return: sqlite3.Connection
+    """
+    conn = sqlite3.connect(db, timeout=TIMEOUT, isolation_level=None)
+    conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                        id INTEGER PRIMARY KEY,
+                        path TEXT UNIQUE NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        worker TEXT,
+                        lease_expires REAL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        error TEXT,
+                        result TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+    conn.execute("CREATE TABLE IF NOT EXISTS config (name TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def create_queue(fld, fl):
+    """
+    Creates the job queue in the data folder with one pending job per zoo file. Paths are stored relative to the
+    data folder, so that machines can mount the shared filesystem at different locations. The settings of this run,
+    see run_config, are stored with the jobs, so that every worker analyses the trials in the same way.
+
+    :param fld: str. Full path to the data folder.
+    :param fl: list of full paths to the zoo files.
+    :return: str. Full path to the queue file.
+    """
+    db = os.path.join(fld, QUEUE_NAME)
+    conn = connect(db)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT OR IGNORE INTO jobs (path) VALUES (?)",
+                         [(os.path.relpath(f, fld),) for f in sorted(fl)])
+        conn.executemany("INSERT OR REPLACE INTO config (name, value) VALUES (?, ?)",
+                         [(name, json.dumps(value)) for name, value in run_config().items()])
+    conn.close()
+
+    return db
+
+
+def run_config():
+    """
+    Collects the settings of main.py that change how a trial is analysed or the parameter set its results are stored
+    under, see results_db.parameter_set.
+
+    :return: dict. Setting name -> value.
+    """
+    return {
+        "SELECTED": registry.SELECTED,
+        "APPROXIMATE": LyE.APPROXIMATE,
+        "APPROX_REFERENCES": LyE.APPROX_REFERENCES,
+        "APPROX_EPS": LyE.APPROX_EPS,
+        "APPROX_BOOTSTRAP": LyE.APPROX_BOOTSTRAP,
+        "APPROX_SEED": LyE.APPROX_SEED,
+        "TIME_BUDGETS": time_budget.TIME_BUDGETS,
+        "FALLBACKS": time_budget.FALLBACKS,
+        "MAX_SAMPLES": time_budget.MAX_SAMPLES,
+        "MEMORY_BUDGET": memory.MEMORY_BUDGET,
+        "TARGET_RATE": resample.TARGET_RATE,
+        "EMBEDDING_POLICY": embedding_cache.POLICY if embedding_cache.CACHE_FILE is not None else None,
+        "SIMILARITY": embedding_cache.SIMILARITY,
+        "COHORT_MIN_TRIALS": embedding_cache.COHORT_MIN_TRIALS,
+        "ParameterSet": parameter_set(),
+    }
+
+
+def queue_config(conn):
+    """
+    :param conn: sqlite3.Connection to the queue.
+    :return: dict. The settings stored by create_queue, see run_config.
+    """
+    config = {name: json.loads(value) for name, value in conn.execute("SELECT name, value FROM config").fetchall()}
+    if not config:
+        raise ValueError('the job queue has no settings, create it again with main.py')
+    return config
+
+
+def apply_config(config):
+    """
+    Applies the settings of the run that created the job queue to this process. The embedding parameter cache itself
+    is set per machine, since its path depends on where the shared filesystem is mounted, see worker.py.
+
+    :param config: dict. The settings, see queue_config.
+    :return: None
+    """
+    if (config["EMBEDDING_POLICY"] is None) != (embedding_cache.CACHE_FILE is None):
+        raise ValueError('the job queue was created {0} an embedding parameter cache, run the worker {0} '
+                         '--embedding-cache'.format('with' if config["EMBEDDING_POLICY"] is not None else 'without'))
+
+    registry.SELECTED = config["SELECTED"]
+    LyE.APPROXIMATE = config["APPROXIMATE"]
+    LyE.APPROX_REFERENCES = config["APPROX_REFERENCES"]
+    LyE.APPROX_EPS = config["APPROX_EPS"]
+    LyE.APPROX_BOOTSTRAP = config["APPROX_BOOTSTRAP"]
+    LyE.APPROX_SEED = config["APPROX_SEED"]
+    time_budget.TIME_BUDGETS = config["TIME_BUDGETS"]
+    time_budget.FALLBACKS = config["FALLBACKS"]
+    time_budget.MAX_SAMPLES = config["MAX_SAMPLES"]
+    memory.set_memory_budget(config["MEMORY_BUDGET"])
+    resample.TARGET_RATE = config["TARGET_RATE"]
+    if config["EMBEDDING_POLICY"] is not None:
+        embedding_cache.set_embedding_cache(embedding_cache.CACHE_FILE, config["EMBEDDING_POLICY"])
+    embedding_cache.SIMILARITY = config["SIMILARITY"]
+    embedding_cache.COHORT_MIN_TRIALS = config["COHORT_MIN_TRIALS"]
+
+    # the parameters of the metrics that are not settings of main.py must be the same in the code of every machine
+    if parameter_set() != config["ParameterSet"]:
+        raise ValueError('the parameters of the metrics differ from those of the job queue:\n    {0}\n    {1}'.format(
+            parameter_set(), config["ParameterSet"]))
+
+
+def claim_job(conn, worker):
+    """
+    Claims the next pending trial, or a trial whose lease has expired because its worker died. Trials that used up
+    their MAX_ATTEMPTS are marked as failed.
+
+    :param conn: sqlite3.Connection to the queue.
+    :param worker: str. Name of the worker.
+    :return: (id, path) of the claimed job, or None if no job is available.
+    """
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE jobs SET status = 'failed', error = 'lease expired' "
+                     "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+        job = conn.execute("SELECT id, path FROM jobs "
+                           "WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+                           "ORDER BY id LIMIT 1", (now,)).fetchone()
+        if job is not None:
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                         "attempts = attempts + 1 WHERE id = ?", (worker, now + LEASE, job[0]))
+
+    return job
+
+
+def renew_lease(conn, job_id, worker):
+    """
+    Extends the lease of a running job. Returns False if the worker no longer holds the job.
+    """
+    with conn:
+        cur = conn.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                           (time.time() + LEASE, job_id, worker))
+    return cur.rowcount == 1
+
+
+def complete_job(conn, job_id, worker, result):
+    """
+    Publishes the results row of a finished trial. If the lease was lost in the meantime, the job belongs to another
+    worker, which will publish the same results.
+    """
+    with conn:
+        conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL "
+                     "WHERE id = ? AND worker = ? AND status = 'running'", (json.dumps(result), job_id, worker))
+
+
+def fail_job(conn, job_id, worker, error):
+    """
+    Returns a job to the queue after an error, or marks it as failed if it used up its MAX_ATTEMPTS.
+    """
+    with conn:
+        conn.execute("UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                     "worker = NULL, lease_expires = NULL, error = ? "
+                     "WHERE id = ? AND worker = ? AND status = 'running'", (MAX_ATTEMPTS, error, job_id, worker))
+
+
+def queue_status(conn):
+    """
+    :return: dict with the number of jobs per status.
+    """
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def run_worker(fld, worker=None):
+    """
+    Runs the Step 2 analysis on trials from the job queue in the data folder until no trials are left. Several
+    workers, on this or other machines that share the data folder, can run at the same time. While a trial is being
+    analysed, its lease is renewed in the background. If a worker dies, its lease expires and the trial is retried by
+    another worker. Before the first trial is claimed, the settings of the run that created the queue are applied, see
+    apply_config.
+
+    :param fld: str. Full path to the data folder, as mounted on this machine.
+    :param worker: str. Name of the worker. Default is hostname:pid.
+    :return: int. Number of trials analysed by this worker.
+    """
+    if worker is None:
+        worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+    db = os.path.join(fld, QUEUE_NAME)
+    if not os.path.exists(db):
+        raise ValueError('no job queue found in {0}'.format(fld))
+
+    conn = connect(db)
+    apply_config(queue_config(conn))
+    n_done = 0
+    progress.start_stage('analysis', None)
+    while True:
+        job = claim_job(conn, worker)
+        status = queue_status(conn)
+        progress.queue_depth('analysis', status)
+        if job is None:
+            if status.get('pending', 0) == 0 and status.get('running', 0) == 0:
+                break
+            # other workers still hold leases, which may expire and need a retry
+            time.sleep(POLL)
+            continue
+
+        job_id, path = job
+        f = os.path.join(fld, path)
+        file_path, file_name, ext = fileparts(f)
+        trial_start = time.time()
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_lease, args=(db, job_id, worker, stop), daemon=True)
+        heartbeat.start()
+        try:
+            data = analyse_trial(grab(f))
+            zsave(f, data)
+            complete_job(conn, job_id, worker, extract_results(data, file_name))
+            n_done += 1
+            progress.trial_done('analysis', file_name + ext, time.time() - trial_start)
+        except Exception as e:
+            print('{0} failed on {1}{2}: {3}'.format(worker, file_name, ext, e))
+            fail_job(conn, job_id, worker, repr(e))
+            progress.trial_done('analysis', file_name + ext, time.time() - trial_start, failed=True)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    conn.close()
+    progress.end_stage('analysis')
+    return n_done
+
+
+def _keep_lease(db, job_id, worker, stop):
+    """
+    Renews the lease of a job every third of the LEASE until stop is set.
+    """
+    conn = connect(db)
+    while not stop.wait(LEASE / 3):
+        if not renew_lease(conn, job_id, worker):
+            break
+    conn.close()
+
+
+def merge_results(fld, fld_stats, results_db=None):
+    """
+    Merges the results published by the workers into results.csv, in the same order and format as zoo2excel. The
+    results are stored under the parameter set of the run that created the job queue.
+
+    :param fld: str. Full path to the data folder.
+    :param fld_stats: str. Full path to the stats folder.
+    :param results_db: sqlite3.Connection to the results database, see results_db.py. If given, the results are
+    upserted into it and results.csv is exported from it.
+    :return: list of paths of the trials that failed.
+    """
+    conn = connect(os.path.join(fld, QUEUE_NAME))
+    jobs = conn.execute("SELECT path, status, result, error FROM jobs ORDER BY path").fetchall()
+    parameters = queue_config(conn)["ParameterSet"]
+    conn.close()
+
+    rows = [json.loads(result) for path, status, result, error in jobs if status == 'done']
+    failed = [path for path, status, result, error in jobs if status != 'done']
+    for path, status, result, error in jobs:
+        if status != 'done':
+            print('WARNING: no results for {0} ({1}: {2})'.format(path, status, error))
+
+    if results_db is None:
+        write_results(rows, fld_stats)
+    else:
+        for row in rows:
+            upsert_results(results_db, row, parameters)
+        export_csv(results_db, fld_stats, parameters)
+
+    return failed
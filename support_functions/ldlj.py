@@ -14,38 +14,100 @@ def log_dimensionless_jerk_imu(data, ch, **kwargs):
     :param ch: list of strings that provide the names three acceleration direction.
     :param kwargs: "event" provides the last step index. Used as input for the Euclidean
     norm. If left empty, the entire timeseries will be analysed.
+    "gyro" provides the names of the three angular velocity directions (in rad/s) of a 6-axis IMU. If given, the
+    jerk is corrected for the rotation of the sensor and the gravity is subtracted from the mean square amplitude.
     :return:
     """
-    if kwargs:
-        event = kwargs.get("event")
+    event = kwargs.get("event")
+    gyro = kwargs.get("gyro")
 
-    ldlj_factor = log_dimensionless_jerk_factors(data, ch, event)
+    ldlj_factor = log_dimensionless_jerk_factors(data, ch, event, gyro)
     ldlj = ldlj_factor[0] + ldlj_factor[1] + ldlj_factor[2]
 
     return ldlj
 
 
+def log_dimensionless_jerk_strides(data, ch, strides, gyro=None):
+    """
+    Calculates the log dimensionless jerk of many strides at once. Each factor of the LDLJ is a sum over the samples
+    of a stride, so the factors of all strides are taken from cumulative sums over the trial, instead of cutting out
+    each stride. The outcome is the same as that of log_dimensionless_jerk on each stride, with the gravity component
+    of the whole trial.
+
+    :param data: dictionary containing all data.
+    :param ch: list of strings that provide the names three acceleration direction.
+    :param strides: (S x 2) array with the first sample and the sample after the last of each stride.
+    :param gyro: list of strings that provide the names of the three angular velocity directions, or None if there
+    is no gyroscope data, see log_dimensionless_jerk_imu.
+    :return: array with the LDLJ of each stride.
+    """
+    strides = np.asarray(strides, dtype=int).reshape(-1, 2)
+    start, end = strides[:, 0], strides[:, 1]
+    last_step = int(np.max(end, initial=1))
+
+    accls = np.column_stack((data[ch[0]]['line'][:last_step],
+                             data[ch[1]]["line"][:last_step],
+                             data[ch[2]]["line"][:last_step]))
+    freq = data["zoosystem"]["Video"]["Freq"]
+    dt = 1. / freq
+    N = end - start
+
+    # Movement duration.
+    mdur = N * dt
+
+    # Gravity subtracted mean square amplitude
+    square = np.r_[0, np.cumsum(np.sum(accls ** 2, axis=1))]
+    mamp = (square[end] - square[start]) / N
+
+    if gyro is not None:
+        gyros = np.column_stack((data[gyro[0]]['line'][:last_step],
+                                 data[gyro[1]]["line"][:last_step],
+                                 data[gyro[2]]["line"][:last_step]))
+        grav = gravity_component(np.asarray(data[ch[0]]['line']),
+                                 np.asarray(data[ch[1]]["line"]),
+                                 np.asarray(data[ch[2]]["line"]))
+        mamp = mamp - np.power(np.linalg.norm(grav), 2)
+        _awcross = np.cross(accls, gyros)
+    else:
+        _awcross = np.zeros(np.shape(accls))
+
+    # Corrected jerk of every sample after the first of the trial. The derivative of the first sample of a stride is
+    # zero, as in log_dimensionless_jerk_factors, which leaves its gyroscope correction.
+    _jsc = np.diff(accls, axis=0) * freq - _awcross[1:]
+    jerk = np.r_[0, np.cumsum(np.sum(_jsc ** 2, axis=1))]
+    mjerk = (jerk[end - 1] - jerk[start] + np.sum(_awcross[start] ** 2, axis=1)) * dt
+
+    return -np.log(mdur) + np.log(mamp) - np.log(mjerk)
+
+
 # embedded functions
-def log_dimensionless_jerk_factors(data, ch, last_step):
+def log_dimensionless_jerk_factors(data, ch, last_step, gyro=None):
     """
     Returns the individual factors of the log dimensionless jerk metric
     used for IMU data.
     :param data: dictionary containing all data.
     :param ch: list of strings that provide the names three acceleration direction.
     :param last_step: int the index for the last step
+    :param gyro: list of strings that provide the names of the three angular velocity directions, or None if there
+    is no gyroscope data.
     ":return: factors to calculate the LDLJ
     """
-    accls = np.array([data[ch[0]]['line'][:last_step],
-                      data[ch[1]]["line"][:last_step],
-                      data[ch[2]]["line"][:last_step]]).T
+    accls = np.column_stack((data[ch[0]]['line'][:last_step],
+                             data[ch[1]]["line"][:last_step],
+                             data[ch[2]]["line"][:last_step]))
 
     N = len(accls)
 
-    gyros = None
+    if gyro is not None:
+        gyros = np.column_stack((data[gyro[0]]['line'][:last_step],
+                                 data[gyro[1]]["line"][:last_step],
+                                 data[gyro[2]]["line"][:last_step]))
+    else:
+        gyros = None
 
-    a_Z_static, a_Y_static, a_X_static = gravity_component(np.array(data[ch[0]]['line']),
-                                                           np.array(data[ch[1]]["line"]),
-                                                           np.array(data[ch[2]]["line"]))
+    a_Z_static, a_Y_static, a_X_static = gravity_component(np.asarray(data[ch[0]]['line']),
+                                                           np.asarray(data[ch[1]]["line"]),
+                                                           np.asarray(data[ch[2]]["line"]))
 
     grav = [a_Z_static, a_Y_static, a_X_static]
 
@@ -66,10 +128,9 @@ def log_dimensionless_jerk_factors(data, ch, last_step):
     # Derivative of the accelerometer signal
     _daccls = np.vstack((np.zeros((1, 3)), np.diff(accls, axis=0) * freq)).T
 
-    # Get corrected jerk if gyroscope data is available.
+    # Get corrected jerk if gyroscope data is available, for all samples at once.
     if gyros is not None:
-        _awcross = np.array([np.cross(_as, _ws)
-                             for _as, _ws in zip(accls, gyros)]).T
+        _awcross = np.cross(accls, gyros).T
     else:
         _awcross = np.zeros(np.shape(_daccls))
 
@@ -0,0 +1,131 @@
+import glob
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from support_functions.fork_context import fork_context
+
+# Some hardcoded values
+WORKERS = None  # processes that read data files in parallel, None uses all CPUs
+# What to do when two data files have a different trial of the same subject and condition:
+#   "error"  raise a ValueError that lists all conflicts, before any trial is converted
+#   "first"  keep the trial of the data file that comes first
+#   "last"   keep the trial of the data file that comes last, e.g. a corrected export
+ON_CONFLICT = "error"
+CONFLICT_POLICIES = ["error", "first", "last"]
+
+
+def load_shards(data_files, workers=WORKERS, on_conflict=None):
+    """
+    Reads the outdoor data set from several archives or json files, e.g. one per site or per day, and merges their
+    conditions and subjects. The files are read in parallel worker processes where processes can safely be forked,
+    i.e. on Linux, and one after another otherwise, see fork_context. The signals are sent back as numpy arrays,
+    which is much faster than sending the lists of the json files.
+
+    A subject and condition that is in more than one file is only a conflict if the trials differ. Identical copies
+    are kept once.
+
+    :param data_files: list of str. Full paths to the .json files, or to zip archives that contain one. A single str
+    reads one file.
+    :param workers: int. Number of worker processes. None uses all CPUs, 1 reads in this process.
+    :param on_conflict: str. "error", "first" or "last", see ON_CONFLICT. Default is ON_CONFLICT.
+    :return: dict. condition -> subject -> trial data, in the order the files list them.
+    """
+    if isinstance(data_files, str):
+        data_files = [data_files]
+    if on_conflict is None:
+        on_conflict = ON_CONFLICT
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError('on_conflict must be one of {0}, not {1!r}'.format(', '.join(CONFLICT_POLICIES), on_conflict))
+    if not data_files:
+        raise ValueError('no data files given')
+
+    context = fork_context() if workers != 1 and len(data_files) > 1 else None
+    if context is not None:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            shards = list(executor.map(_read_shard, data_files))
+    else:
+        shards = [_read_shard(data_file) for data_file in data_files]
+
+    r = {}
+    sources = {}
+    conflicts = []
+    for data_file, shard in zip(data_files, shards):
+        for c, subjects in shard.items():
+            r.setdefault(c, {})
+            for s, trial in subjects.items():
+                if s not in r[c]:
+                    r[c][s] = trial
+                    sources[(c, s)] = data_file
+                elif _same_trial(r[c][s], trial):
+                    print('WARNING: {0} {1} is in both {2} and {3}, kept once'.format(
+                        s, c, os.path.basename(sources[(c, s)]), os.path.basename(data_file)))
+                elif on_conflict == "error":
+                    conflicts.append('{0} {1} differs between {2} and {3}'.format(
+                        s, c, os.path.basename(sources[(c, s)]), os.path.basename(data_file)))
+                else:
+                    print('WARNING: {0} {1} differs between {2} and {3}, kept the {4}'.format(
+                        s, c, os.path.basename(sources[(c, s)]), os.path.basename(data_file), on_conflict))
+                    if on_conflict == "last":
+                        r[c][s] = trial
+                        sources[(c, s)] = data_file
+
+    if conflicts:
+        raise ValueError('conflicting trials in the data files:\n    ' + '\n    '.join(conflicts))
+
+    return r
+
+
+def load_data(data_file):
+    """
+    Reads the outdoor data set from data.json, or straight from a zip archive that contains it, without extracting
+    the archive to disk.
+
+    :param data_file: str. Full path to the .json or .zip file.
+    :return: dict. condition -> subject -> trial data.
+    """
+    if zipfile.is_zipfile(data_file):
+        with zipfile.ZipFile(data_file, 'r') as zip_ref:
+            name = [n for n in zip_ref.namelist() if n.endswith('.json')][0]
+            with zip_ref.open(name) as f:
+                return json.load(f)
+
+    with open(data_file, 'r') as f:
+        return json.load(f)
+
+
+def find_data_files(fld, patterns):
+    """
+    Finds the data files in a folder.
+
+    :param fld: str. Full path to the folder.
+    :param patterns: list of str. File names or glob patterns, e.g. ["data.json.zip"] or ["site_*.zip"].
+    :return: list of full paths, in the order of the patterns and sorted by name within a pattern.
+    """
+    data_files = []
+    for pattern in patterns:
+        data_files += [f for f in sorted(glob.glob(os.path.join(fld, pattern))) if f not in data_files]
+
+    if not data_files:
+        raise ValueError('no data files found for {0} in {1}'.format(', '.join(patterns), fld))
+    return data_files
+
+
+# embedded functions
+def _read_shard(data_file):
+    """
+    Reads one data file, with the signals of each trial as numpy arrays.
+    """
+    return {c: {s: {k: np.asarray(v) if isinstance(v, list) else v for k, v in trial.items()}
+                for s, trial in subjects.items()}
+            for c, subjects in load_data(data_file).items()}
+
+
+def _same_trial(trial, other):
+    """
+    Checks whether two trials have the same signals and values.
+    """
+    return trial.keys() == other.keys() and all(np.array_equal(trial[k], other[k]) for k in trial)
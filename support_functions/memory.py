@@ -0,0 +1,193 @@
+import csv
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Some hard coded values
+# Memory budget in bytes for a single metric. None disables the budget and always runs the default (fastest) variant.
+MEMORY_BUDGET = None
+
+# How stage peaks are measured. "rss" samples the resident set size from a background thread, which is cheap but
+# only available where /proc/self/statm exists (Linux). "tracemalloc" traces every allocation, which is exact but
+# slows down the Python loops of LyE_R and FNN considerably. "rss" falls back to "tracemalloc" where unavailable.
+MEMORY_TRACKING = 'rss'
+SAMPLE_INTERVAL = 0.005  # seconds between RSS samples
+
+# Bytes per element of the arrays allocated by the metrics
+FLOAT_BYTES = 8
+
+# Peak memory per pipeline stage, filled by track_memory
+_REPORT = {}
+# Stages that are currently running, outermost first. Each holds its baseline and the peak seen so far.
+_STACK = []
+_SAMPLER = None
+
+
+def set_memory_budget(budget):
+    """
+    Sets the memory budget that the metrics check before allocating their large intermediates.
+
+    :param budget: int or float. Budget in bytes, or None to disable.
+    :return: None
+    """
+    global MEMORY_BUDGET
+    MEMORY_BUDGET = budget
+
+
+def within_budget(nbytes):
+    """
+    Checks whether an estimated footprint fits in the configured memory budget.
+
+    :param nbytes: estimated number of bytes.
+    :return: bool. True if no budget is set or the estimate fits.
+    """
+    return MEMORY_BUDGET is None or nbytes <= MEMORY_BUDGET
+
+
+def estimate_footprint(metric, n, dim=2):
+    """
+    Estimates the peak number of bytes a metric allocates for a signal of a given length.
+
+    :param metric: str. "LyE_R" or "LyE_R_streaming".
+    :param n: int. Number of embedded points M.
+    :param dim: int. Embedding dimension.
+    :return: int. Estimated peak number of bytes.
+    """
+    if metric == "LyE_R":
+        # M x M distance matrix plus the per-point differences, the embedding is a view on the signal
+        return n * n * FLOAT_BYTES + 2 * n * dim * FLOAT_BYTES
+    elif metric == "LyE_R_streaming":
+        # running sums and counts of the log divergence plus the per-point differences
+        return 2 * n * FLOAT_BYTES + 2 * n * dim * FLOAT_BYTES
+    else:
+        raise ValueError('unknown metric {0}'.format(metric))
+
+
+@contextmanager
+def track_memory(stage):
+    """
+    Tracks the peak memory used while the block is running and adds it to the memory report. Repeated calls with the
+    same stage name keep the largest peak, e.g. when a metric is run on every trial. Stages can be nested.
+
+    The peak is the growth over the memory in use when the block started, measured as set by MEMORY_TRACKING. The
+    peak resident set size of the process is sampled when the block finishes.
+
+    :param stage: str. Name of the stage in the report.
+    """
+    use_rss = MEMORY_TRACKING == 'rss' and current_rss() > 0
+    if use_rss:
+        _start_sampler()
+        base = current_rss()
+    else:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # resetting the peak would lose the peak of an enclosing stage, so carry it over first
+        _update_peaks(tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+
+    frame = {'base': base, 'peak': base, 'rss': use_rss}
+    _STACK.append(frame)
+    start_time = time.time()
+
+    try:
+        yield
+    finally:
+        duration = time.time() - start_time
+        if use_rss:
+            _update_peaks(current_rss())
+        else:
+            _update_peaks(tracemalloc.get_traced_memory()[1])
+        _STACK.remove(frame)
+        if not use_rss and not any(not f['rss'] for f in _STACK):
+            tracemalloc.stop()
+
+        entry = _REPORT.setdefault(stage, {'calls': 0, 'peak_bytes': 0, 'seconds': 0.0, 'max_rss_bytes': 0})
+        entry['calls'] += 1
+        entry['peak_bytes'] = max(entry['peak_bytes'], frame['peak'] - frame['base'])
+        entry['seconds'] += duration
+        entry['max_rss_bytes'] = max(entry['max_rss_bytes'], max_rss())
+
+
+def _update_peaks(value, rss=None):
+    """
+    Raises the peak of the running stages to value. If rss is given, only stages measured that way are updated.
+    """
+    for frame in list(_STACK):
+        if rss is None or frame['rss'] == rss:
+            frame['peak'] = max(frame['peak'], value)
+
+
+def _start_sampler():
+    """
+    Starts the background thread that samples the resident set size while stages are running.
+    """
+    global _SAMPLER
+    if _SAMPLER is not None and _SAMPLER.is_alive():
+        return
+
+    def sample():
+        while True:
+            if _STACK:
+                _update_peaks(current_rss(), rss=True)
+            time.sleep(SAMPLE_INTERVAL)
+
+    _SAMPLER = threading.Thread(target=sample, name='memory-sampler', daemon=True)
+    _SAMPLER.start()
+
+
+def current_rss():
+    """
+    Returns the current resident set size of the process in bytes, or 0 if it can not be determined.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def max_rss():
+    """
+    Returns the peak resident set size of the process in bytes, or 0 if it can not be determined.
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def memory_report(fld_stats=None):
+    """
+    Prints the per-stage memory report and optionally writes it to memory_report.csv.
+
+    :param fld_stats: full path to stats folder. If None the report is only printed.
+    :return: dict. The report, keyed by stage name.
+    """
+    print(' ')
+    print('**********************************')
+    print('Peak memory per stage:')
+    for stage, entry in _REPORT.items():
+        print('{0:<30} {1:>10.1f} MB  (peak RSS {2:.1f} MB, {3} calls, {4:.2f} s)'.format(
+            stage, entry['peak_bytes'] / 2 ** 20, entry['max_rss_bytes'] / 2 ** 20, entry['calls'],
+            entry['seconds']))
+    print('**********************************')
+
+    if fld_stats is not None:
+        with open(fld_stats + "/memory_report.csv", 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Stage', 'Calls', 'PeakBytes', 'MaxRSSBytes', 'Seconds'])
+            for stage, entry in _REPORT.items():
+                writer.writerow([stage, entry['calls'], entry['peak_bytes'], entry['max_rss_bytes'],
+                                 entry['seconds']])
+
+    return _REPORT
@@ -0,0 +1,84 @@
+import os
+import time
+
+from support_functions.analyse_trial import analyse_trial
+from support_functions.cross_sample_entropy import cross_surface_entropy, add_cross_surface_events
+from support_functions.grab import grab
+from support_functions.load_shards import load_shards
+from support_functions.outdoor2zoo import build_zoo
+from support_functions import progress
+from support_functions.results_db import upsert_results, export_csv
+from support_functions.zoo2excel import extract_results, write_results, CROSS_SURFACE_COLUMN
+from support_functions.zsave import zsave
+
+
+def outdoor2results(data_files, fld_stats, fld=None, results_db=None, cross_surface=False):
+    """
+    OUTDOOR2RESULTS runs the whole pipeline in memory: each trial of the outdoor data set is converted to the zoo
+    format, analysed and added to the results, without writing and re-reading intermediate zoo files. The outcome is
+    the same results.csv as outdoor2zoo, analyse_trial and zoo2excel give through the zoo files.
+
+    :param data_files: list of str. Full paths to the .json files or zip archives of the data set, whose conditions
+    and subjects are merged, see load_shards. A single str reads one file.
+    :param fld_stats: str. Full path to stats folder.
+    :param fld: str. Full path to data folder. If given, the analysed zoo files are also saved there, in the
+    subject/condition folders. If None, no zoo files are written.
+    :param results_db: sqlite3.Connection to the results database, see results_db.py. If given, each trial is
+    upserted as soon as it is analysed and results.csv is exported from the database.
+    :param cross_surface: bool. If True, the cross-sample entropy of the Euclidean norm of each pair of surfaces of
+    each subject is added once all trials are analysed, see cross_surface_entropy.
+    :return: None
+    """
+    start_time = time.time()
+    r = load_shards(data_files)
+
+    rows = []
+    norms = {}
+    progress.start_stage('analysis', sum(len(r[c]) for c in r.keys()))
+    for c in r.keys():
+        if not r[c]:
+            print('no data for condition {0}'.format(c))
+            continue
+
+        for s in r[c].keys():
+            fname = "{0}_{1}.zoo".format(s, c)
+            trial_start = time.time()
+            data = analyse_trial(build_zoo(r[c][s], fname))
+            row = extract_results(data, "{0}_{1}".format(s, c))
+
+            if fld is not None:
+                nfld = os.path.join(fld, s, c)
+                os.makedirs(nfld, exist_ok=True)
+                zsave(os.path.join(nfld, fname), data)
+
+            if results_db is not None:
+                upsert_results(results_db, row)
+            rows.append(row)
+            if cross_surface:
+                norms[(s, c)] = data["Acc_euclidean"]["line"]
+            progress.trial_done('analysis', fname, time.time() - trial_start)
+    progress.end_stage('analysis')
+
+    if cross_surface:
+        xsampen = cross_surface_entropy(norms)
+        for row in rows:
+            s, c = row["Subject_ID"], row["Surface"]
+            row.update({CROSS_SURFACE_COLUMN + other: value for other, value in xsampen[(s, c)].items()})
+            if fld is not None:
+                f = os.path.join(fld, s, c, "{0}_{1}.zoo".format(s, c))
+                zsave(f, add_cross_surface_events(grab(f), xsampen[(s, c)]))
+            if results_db is not None:
+                upsert_results(results_db, row)
+
+    if results_db is not None:
+        export_csv(results_db, fld_stats)
+    else:
+        # same order as the sorted zoo files in zoo2excel
+        rows.sort(key=lambda row: (row["Subject_ID"], row["Surface"]))
+        write_results(rows, fld_stats)
+
+    time_to_finish = time.time() - start_time
+    print(' ')
+    print('**********************************')
+    print('Finished analysing data in: {:.2f} seconds'.format(time_to_finish))
+    print('**********************************')
@@ -1,19 +1,26 @@
-import tkinter as tk
 import time
 import os
-import json
-from tkinter import filedialog
+from concurrent.futures import ProcessPoolExecutor
 from support_functions.setZoosystem import setZoosystem
 from support_functions.add_channel import addchannel_data
 from support_functions.zsave import zsave
 from support_functions.engine import engine
+from support_functions.fork_context import fork_context
+from support_functions.load_shards import load_shards
+from support_functions.resample import resample
+from support_functions import progress
 
 # Some hardcoded values
 CHNS = ['Acc_x', 'Acc_y', "Acc_z"]
-SAMPLE_RATE = 100
+GYRO_CHNS = ['Gyr_x', 'Gyr_y', 'Gyr_z']  # only in exports of 6-axis IMUs, in rad/s
+SAMPLE_RATE = 100  # Hz, for exports without a sample_rate
+WORKERS = None  # processes that convert trials in parallel, None uses all CPUs
 
+# The data set being converted, see _set_data
+_DATA = None
 
-def outdoor2zoo(fld):
+
+def outdoor2zoo(fld, workers=WORKERS, data_files=None):
     """
     OUTDOOR2ZOO is a custom function to convert data from outdoor data set to zoo format. The zoo format in Python is
     modeled after the biomechZoo toolbox, which is an open-source toolbox for the processing, analysis,
@@ -27,59 +34,142 @@ def outdoor2zoo(fld):
     processing, analysis, and visualization of biomechanical movement data.
     Computer Methods and Programs in Biomedicine, 140, 1-10.
 
-    :param fld: str. Full path to data folder
-    :return: None
-    """
+    The zoo file of each trial is written to fld/subject/condition/subject_condition.zoo. The data set can be split
+    over several data files, e.g. one per site or per day, whose conditions and subjects are merged, see load_shards.
+    The data files are read and the trials are converted in parallel worker processes where processes can safely be
+    forked, i.e. on Linux, and one after another otherwise, see fork_context.
 
+    :param fld: str. Full path to data folder. If None, a folder dialog is shown, which requires tkinter.
+    :param workers: int. Number of worker processes. None uses all CPUs, 1 converts in this process.
+    :param data_files: list of str. Full paths to the .json files or zip archives of the data set. Default reads all
+    .json files in fld.
+    :return: list of full paths to the zoo files.
+    """
 
     if fld is None:
-        root = tk.Tk()
-        root.withdraw()
-        fld = filedialog.askdirectory()
+        fld = ask_folder()
 
     start_time = time.time()
-    os.chdir(fld)
 
-    fl = engine(path=fld, extension='.json')
-    with open(fl[0], 'r') as f:
-        r = json.load(f)
+    if data_files is None:
+        data_files = engine(path=fld, extension='.json')
+    r = load_shards(data_files, workers)
 
-    cons = r.keys()
-
-    for c in cons:
+    jobs = []
+    for c in r.keys():
         if not r[c]:
             print('no data for condition {0}'.format(c))
             continue
 
-        subs = r[c].keys()
-        for s in subs:
-            r[c][s].keys()
+        for s in r[c].keys():
             fname = "{0}_{1}.zoo".format(s, c)
-            print("creating zoo file for {0}".format(fname))
-            evts = r[c][s]['last_step_index']
-            print(evts)
-            data = {}
-            data['zoosystem'] = setZoosystem(fname)
-            data['zoosystem']['Units'] = {}
-            data['zoosystem']['Video']["Freq"] = SAMPLE_RATE
-            data['zoosystem']['AVR'] = 0
-
-            for ch in CHNS:
-                ndata = r[c][s][ch]
-                if isinstance(ndata, int):
-                    ndata = [ndata]
-                data = addchannel_data(data, f'{ch}', ndata, 'video')
-                if ch == 'Acc_x':
-                    data['{0}'.format(ch)]['event'] = {
-                        f'FS1': [evts, 0, 0],
-                    }
-
-                # Save all into to file
-            zsave(fname, data)
-
-        time_to_finish = time.time() - start_time
-        print(' ')
-        print('**********************************')
-        print('Finished converting data in: {:.2f} seconds'.format(time_to_finish))
-        # print(f"{time.time() - start_time:.2f} seconds")
-        print('**********************************')
+            jobs.append((c, s, os.path.join(fld, s, c, fname)))
+
+    progress.start_stage('conversion', len(jobs))
+    fl = []
+    context = fork_context() if workers != 1 and len(jobs) > 1 else None
+    if context is not None:
+        # forked workers share the data set with this process, so only the keys of each trial are sent to them
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_set_data, initargs=(r,)) as executor:
+            for path in executor.map(_convert_job, jobs):
+                fl.append(path)
+                progress.trial_done('conversion', os.path.basename(path))
+    else:
+        _set_data(r)
+        for job in jobs:
+            trial_start = time.time()
+            fl.append(_convert_job(job))
+            progress.trial_done('conversion', os.path.basename(job[2]), time.time() - trial_start)
+    _set_data(None)
+    progress.end_stage('conversion')
+
+    time_to_finish = time.time() - start_time
+    print(' ')
+    print('**********************************')
+    print('Finished converting data in: {:.2f} seconds'.format(time_to_finish))
+    print('**********************************')
+
+    return fl
+
+
+def convert_trial(trial, fname, path):
+    """
+    Converts a single trial of the outdoor data set to a zoo file.
+
+    :param trial: dict. The data of one subject in one condition, see build_zoo.
+    :param fname: str. Name of the zoo file.
+    :param path: str. Full path of the zoo file. Its folder is created if it does not exist.
+    :return: str. path.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    zsave(path, build_zoo(trial, fname))
+
+    return path
+
+
+def build_zoo(trial, fname):
+    """
+    Builds the zoo data of a single trial of the outdoor data set. If resample.TARGET_RATE is set, the trial is
+    resampled to it, see resample.
+
+    :param trial: dict. The data of one subject in one condition, with the acceleration channels and the
+    last_step_index. The angular velocity channels are added as well if the trial has them, and the sample rate in Hz
+    if it is given as sample_rate, otherwise SAMPLE_RATE is used.
+    :param fname: str. Name of the zoo file, stored as the source file in the zoosystem.
+    :return: data: dict. The zoo data.
+    """
+    evts = trial['last_step_index']
+    data = {}
+    data['zoosystem'] = setZoosystem(fname)
+    data['zoosystem']['Units'] = {}
+    data['zoosystem']['Video']["Freq"] = trial.get('sample_rate', SAMPLE_RATE)
+    data['zoosystem']['AVR'] = 0
+
+    chns = CHNS + GYRO_CHNS if all(ch in trial for ch in GYRO_CHNS) else CHNS
+
+    for ch in chns:
+        ndata = trial[ch]
+        if isinstance(ndata, int):
+            ndata = [ndata]
+        data = addchannel_data(data, f'{ch}', ndata, 'video')
+        if ch == 'Acc_x':
+            data['{0}'.format(ch)]['event'] = {
+                f'FS1': [evts, 0, 0],
+            }
+
+    return resample(data)
+
+
+def _set_data(r):
+    """
+    Sets the data set that _convert_job reads the trials from, in this process or in a worker process.
+    """
+    global _DATA
+    _DATA = r
+
+
+def _convert_job(job):
+    """
+    Converts the trial of a (condition, subject, path) job, see convert_trial.
+    """
+    c, s, path = job
+    return convert_trial(_DATA[c][s], os.path.basename(path), path)
+
+
+def ask_folder():
+    """
+    Asks for the data folder with a folder dialog. tkinter is imported here, so that it is only needed when the
+    dialog is actually used, and not on headless machines.
+
+    :return: str. Full path to the selected folder.
+    """
+    try:
+        import tkinter as tk
+        from tkinter import filedialog
+    except ImportError:
+        raise ValueError('no data folder given and tkinter is not available to select one, please provide fld')
+
+    root = tk.Tk()
+    root.withdraw()
+    return filedialog.askdirectory()
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Some hardcoded values
+# File the progress metrics are written to, in the Prometheus text exposition format, e.g. for the textfile collector
+# of the node exporter (a file ending in .prom). None keeps the metrics in memory for progress_report only.
+METRICS_FILE = None
+# Print a line for every trial, as the pipeline used to. False only prints the summary of progress_report.
+VERBOSE = False
+WINDOW = 20  # number of recent trials and metric runs the rates and moving averages are taken over
+WRITE_INTERVAL = 1.0  # shortest time in seconds between two writes of the metrics file, except at the end of a stage
+PREFIX = "nld_"
+
+# Progress per stage, e.g. "conversion", "analysis" and "extraction", filled by start_stage and trial_done
+_STAGES = {}
+# Seconds of the recent runs of each metric, filled by metric_done
+_METRICS = {}
+_LOCK = threading.Lock()
+_LAST_WRITE = 0.0
+
+
+def set_progress(metrics_file, verbose=None):
+    """
+    Sets where the progress metrics are written to.
+
+    :param metrics_file: str. Full path to the metrics file. None does not write a file.
+    :param verbose: bool. Print a line for every trial. Default keeps the current VERBOSE.
+    :return: None
+    """
+    global METRICS_FILE, VERBOSE
+    METRICS_FILE = metrics_file
+    if verbose is not None:
+        VERBOSE = verbose
+
+
+def start_stage(stage, total):
+    """
+    Starts counting the trials of a stage of the pipeline.
+
+    :param stage: str. Name of the stage.
+    :param total: int. Number of trials in the stage, or None if unknown, e.g. for a worker of the job queue.
+    :return: None
+    """
+    with _LOCK:
+        _STAGES[stage] = {"total": total, "done": 0, "failed": 0, "start": time.time(), "end": None,
+                          "finished": deque(maxlen=WINDOW), "seconds": deque(maxlen=WINDOW), "queue": None}
+    write_metrics(force=True)
+
+
+def trial_done(stage, name, seconds=None, failed=False):
+    """
+    Counts a trial of a stage as done, and updates the metrics file.
+
+    :param stage: str. Name of the stage, see start_stage.
+    :param name: str. Name of the trial, only printed if VERBOSE.
+    :param seconds: float. Time the trial took, or None if unknown, e.g. when trials run in parallel.
+    :param failed: bool. True if the trial failed.
+    :return: None
+    """
+    if VERBOSE:
+        print('{0} {1} {2}'.format(stage, 'failed on' if failed else 'done:', name))
+
+    with _LOCK:
+        entry = _STAGES[stage]
+        entry["failed" if failed else "done"] += 1
+        entry["finished"].append(time.time())
+        if seconds is not None:
+            entry["seconds"].append(seconds)
+    write_metrics()
+
+
+def end_stage(stage):
+    """
+    Stops the clock of a stage, and writes the metrics file.
+    """
+    with _LOCK:
+        _STAGES[stage]["end"] = time.time()
+    write_metrics(force=True)
+
+
+def metric_done(metric, seconds):
+    """
+    Adds the time a metric took on a trial to its moving average.
+
+    :param metric: str. Name of the metric in registry.py.
+    :param seconds: float.
+    :return: None
+    """
+    with _LOCK:
+        _METRICS.setdefault(metric, {"runs": 0, "seconds": deque(maxlen=WINDOW)})
+        _METRICS[metric]["runs"] += 1
+        _METRICS[metric]["seconds"].append(seconds)
+
+
+def queue_depth(stage, status):
+    """
+    Sets the number of jobs per status of the job queue a stage takes its trials from. The remaining time of the
+    stage is then estimated from the pending and running jobs of all workers.
+
+    :param stage: str. Name of the stage, see start_stage.
+    :param status: dict with the number of jobs per status, see job_queue.queue_status.
+    :return: None
+    """
+    with _LOCK:
+        _STAGES[stage]["queue"] = dict(status)
+
+
+def stage_progress(stage):
+    """
+    :param stage: str. Name of the stage, see start_stage.
+    :return: dict with the number of trials "done", "failed" and "remaining" (None if unknown), the "elapsed" seconds,
+    the "rate" in trials per second over the last WINDOW trials, the estimated seconds until the stage is done "eta"
+    (None if unknown) and the moving average of the seconds per trial "trial_seconds" (None if unknown).
+    """
+    with _LOCK:
+        entry = _STAGES[stage]
+        now = entry["end"] or time.time()
+        finished = list(entry["finished"])
+
+        if len(finished) == WINDOW and finished[-1] > finished[0]:
+            rate = (len(finished) - 1) / (finished[-1] - finished[0])
+        elif finished and finished[-1] > entry["start"]:
+            rate = len(finished) / (finished[-1] - entry["start"])
+        else:
+            rate = 0.0
+
+        if entry["queue"] is not None:
+            remaining = entry["queue"].get("pending", 0) + entry["queue"].get("running", 0)
+        elif entry["total"] is not None:
+            remaining = max(entry["total"] - entry["done"] - entry["failed"], 0)
+        else:
+            remaining = None
+
+        if remaining == 0:
+            eta = 0.0
+        elif remaining is not None and rate > 0:
+            eta = remaining / rate
+        else:
+            eta = None
+
+        seconds = list(entry["seconds"])
+        return {"done": entry["done"], "failed": entry["failed"], "remaining": remaining,
+                "elapsed": now - entry["start"], "rate": rate, "eta": eta,
+                "trial_seconds": sum(seconds) / len(seconds) if seconds else None}
+
+
+def write_metrics(force=False):
+    """
+    Writes the progress metrics to METRICS_FILE in the Prometheus text exposition format. The file is replaced at
+    once, so a scraper never reads half a file. Writes are at least WRITE_INTERVAL apart, unless forced.
+
+    :param force: bool. Write even if the last write was less than WRITE_INTERVAL ago.
+    :return: None
+    """
+    global _LAST_WRITE
+    if METRICS_FILE is None or (not force and time.time() - _LAST_WRITE < WRITE_INTERVAL):
+        return
+    _LAST_WRITE = time.time()
+
+    progress = {stage: stage_progress(stage) for stage in list(_STAGES)}
+    with _LOCK:
+        queues = {stage: entry["queue"] for stage, entry in _STAGES.items() if entry["queue"] is not None}
+        metrics = {metric: (entry["runs"], list(entry["seconds"])) for metric, entry in _METRICS.items()}
+
+    lines = []
+    _add_family(lines, "trials_completed_total", "counter", "Trials completed per stage.",
+                {(("stage", s),): p["done"] for s, p in progress.items()})
+    _add_family(lines, "trials_failed_total", "counter", "Trials that failed per stage.",
+                {(("stage", s),): p["failed"] for s, p in progress.items()})
+    _add_family(lines, "trials_remaining", "gauge", "Trials left per stage.",
+                {(("stage", s),): p["remaining"] for s, p in progress.items() if p["remaining"] is not None})
+    _add_family(lines, "trials_per_second", "gauge", "Trials per second over the last {0} trials.".format(WINDOW),
+                {(("stage", s),): p["rate"] for s, p in progress.items()})
+    _add_family(lines, "trial_seconds", "gauge", "Moving average of the seconds per trial.",
+                {(("stage", s),): p["trial_seconds"] for s, p in progress.items() if p["trial_seconds"] is not None})
+    _add_family(lines, "eta_seconds", "gauge", "Estimated seconds until the stage is done.",
+                {(("stage", s),): p["eta"] for s, p in progress.items() if p["eta"] is not None})
+    _add_family(lines, "stage_elapsed_seconds", "gauge", "Seconds since the start of the stage.",
+                {(("stage", s),): p["elapsed"] for s, p in progress.items()})
+    _add_family(lines, "queue_jobs", "gauge", "Jobs in the job queue per status.",
+                {(("stage", s), ("status", status)): n for s, queue in queues.items() for status, n in queue.items()})
+    _add_family(lines, "metric_runs_total", "counter", "Trials each metric was calculated on.",
+                {(("metric", m),): runs for m, (runs, seconds) in metrics.items()})
+    _add_family(lines, "metric_seconds", "gauge",
+                "Moving average of the seconds per trial of each metric over the last {0} trials.".format(WINDOW),
+                {(("metric", m),): sum(seconds) / len(seconds) for m, (runs, seconds) in metrics.items()})
+    _add_family(lines, "last_update_timestamp_seconds", "gauge", "Time of the last update of this file.",
+                {(): _LAST_WRITE})
+
+    tmp_file = '{0}.{1}.tmp'.format(METRICS_FILE, os.getpid())
+    with open(tmp_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_file, METRICS_FILE)
+
+
+def progress_report():
+    """
+    Prints a summary of the progress of each stage and the moving average of the time of each metric, and writes the
+    metrics file.
+
+    :return: dict. The stage_progress of each stage, keyed by stage name.
+    """
+    progress = {stage: stage_progress(stage) for stage in list(_STAGES)}
+    write_metrics(force=True)
+
+    print(' ')
+    print('**********************************')
+    print('Progress per stage:')
+    for stage, p in progress.items():
+        print('{0:<30} {1:>5} trials, {2} failed, {3:.2f} s ({4:.2f} trials/s)'.format(
+            stage, p["done"], p["failed"], p["elapsed"], p["rate"]))
+    with _LOCK:
+        metrics = {metric: list(entry["seconds"]) for metric, entry in _METRICS.items()}
+    for metric, seconds in metrics.items():
+        print('{0:<30} {1:>10.2f} s per trial'.format(metric, sum(seconds) / len(seconds)))
+    print('**********************************')
+
+    return progress
+
+
+# embedded functions
+def _add_family(lines, name, kind, description, samples):
+    """
+    Adds a metric family to the lines of the metrics file.
+
+    :param lines: list of str.
+    :param name: str. Name of the metric, without PREFIX.
+    :param kind: str. "counter" or "gauge".
+    :param description: str. The HELP text.
+    :param samples: dict. Tuple of (label, value) pairs -> value of the sample.
+    """
+    if not samples:
+        return
+
+    lines.append('# HELP {0}{1} {2}'.format(PREFIX, name, description))
+    lines.append('# TYPE {0}{1} {2}'.format(PREFIX, name, kind))
+    for labels, value in samples.items():
+        label_text = ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                              for k, v in labels)
+        lines.append('{0}{1}{2} {3}'.format(PREFIX, name, '{' + label_text + '}' if labels else '',
+                                            _format_value(value)))
+
+
+def _format_value(value):
+    """
+    Formats a sample value, with NaN and infinity as the exposition format spells them.
+    """
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
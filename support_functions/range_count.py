@@ -0,0 +1,66 @@
+import numpy as np
+
+from support_functions.time_budget import check_deadline
+
+# Some hardcoded values
+CHUNK = 1000  # points per kd-tree query, the time budget is checked between chunks
+# Points per leaf of the kd-trees. The tolerances of sample entropy are wide compared with the spread of the templates,
+# so larger leaves than the default of 16, split at the midpoint, are faster to search.
+LEAFSIZE = 64
+
+
+def range_count(points, r, other=None):
+    """
+    Counts the pairs of points that lie within a distance r of each other in every coordinate (Chebyshev distance),
+    which is how sample entropy matches templates. The points are put in a kd-tree, so that each point is only
+    compared with the points near it, instead of with all others. This keeps the counts fast for templates of several
+    signals at once.
+
+    :param points: (N x d) array, e.g. templates of d samples.
+    :param r: float. Tolerance, points match if no coordinate differs by more than r.
+    :param other: (M x d) array, or its kd-tree from kd_tree to reuse it for several counts. If given, the pairs of a
+    point of points and a point of other are counted instead.
+    :return: int. Number of matching pairs. Without other, each pair is counted once and without self-matches.
+    """
+    points = np.asarray(points, dtype=float)
+    tree = kd_tree(points if other is None else other)
+
+    total = 0
+    for start in range(0, len(points), CHUNK):
+        check_deadline()
+        total += int(np.sum(tree.query_ball_point(points[start:start + CHUNK], r, p=np.inf, return_length=True)))
+
+    if other is None:
+        return (total - len(points)) // 2
+    return total
+
+
+def range_pairs(points, r):
+    """
+    Finds the pairs of points that lie within a distance r of each other in every coordinate, see range_count. The
+    pairs are returned for one chunk of CHUNK points at a time, so that not all pairs are kept in memory at once.
+
+    :param points: (N x d) array, e.g. templates of d samples.
+    :param r: float. Tolerance, points match if no coordinate differs by more than r.
+    :return: generator of (i, j) arrays with the indices of the matching pairs, each pair once with i < j.
+    """
+    points = np.asarray(points, dtype=float)
+
+    for start in range(0, len(points), CHUNK):
+        check_deadline()
+        pairs = kd_tree(points[start:start + CHUNK]).sparse_distance_matrix(kd_tree(points[start:]), r, p=np.inf,
+                                                                              output_type='ndarray')
+        later = pairs['j'] > pairs['i']
+        yield pairs['i'][later] + start, pairs['j'][later] + start
+
+
+def kd_tree(points):
+    """
+    :param points: (N x d) array, or a kd-tree that is returned as is.
+    :return: scipy.spatial.cKDTree of the points.
+    """
+    from scipy.spatial import cKDTree
+
+    if isinstance(points, cKDTree):
+        return points
+    return cKDTree(np.asarray(points, dtype=float), leafsize=LEAFSIZE, balanced_tree=False)
@@ -0,0 +1,334 @@
+import numpy as np
+
+from support_functions import LyE, time_budget
+from support_functions.cross_sample_entropy import cross_sample_entropy_pairs, EVENT_PREFIX
+from support_functions.dfa import dfa
+from support_functions.rqa import rqa
+from support_functions.steps import detect_steps, stride_metrics
+from support_functions.ldlj import log_dimensionless_jerk_imu
+from support_functions.sample_entropy import sample_entropy_norm, multivariate_sample_entropy
+from support_functions.symmetry import symmetry_norm
+
+# Some hardcoded values
+# Names of the metrics to calculate, e.g. ["log_dimensionless_jerk_imu", "symmetry"]. Metrics they require are added.
+# None calculates the default metrics in METRICS.
+SELECTED = None
+# Inputs the pipeline provides to the tasks of the metrics
+INPUTS = ["norm", "lines", "fs", "data", "channels", "last_step_index", "gyro", "trial"]
+
+
+def selected_metrics(selected=None):
+    """
+    Resolves the metrics to calculate, including the metrics they require, in the order of METRICS.
+
+    :param selected: list of metric names. Default is SELECTED, or the metrics that are not marked "default": False.
+    :return: list of metric names.
+    """
+    if selected is None:
+        selected = SELECTED
+    if selected is None:
+        return [m for m in METRICS if METRICS[m].get("default", True)]
+
+    unknown = [m for m in selected if m not in METRICS]
+    if unknown:
+        raise ValueError('unknown metric(s) {0}, choose from {1}'.format(', '.join(unknown), ', '.join(METRICS)))
+
+    needed = set()
+    todo = list(selected)
+    while todo:
+        metric = todo.pop()
+        if metric not in needed:
+            needed.add(metric)
+            todo += METRICS[metric]["requires"]
+
+    return [m for m in METRICS if m in needed]
+
+
+def columns(optional=False):
+    """
+    :param optional: bool. If True, the optional columns, which are only written when the trials have their events.
+    :return: dict. Results column -> (channel, event), in the order of METRICS.
+    """
+    key = "optional_columns" if optional else "columns"
+    return {column: source for spec in METRICS.values() for column, source in spec.get(key, {}).items()}
+
+
+# embedded functions
+# Each metric has a task that calculates it from the INPUTS it names, and an outputs function that turns its result
+# into channels and events. The task is called as task(*inputs, fallback) by run_with_budget, with fallback None or
+# the fallback strategy after the time budget was exceeded (see time_budget.py), and returns None if skipped. outputs
+# is called as outputs(result, record, required, fs), with the record of run_with_budget and a dict with the results
+# of the metrics it requires, and returns (channels, events): {channel: line} and {channel: {event: [value, 0, 0]}}.
+def _sample_entropy_task(norm, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    return sample_entropy_norm(norm)
+
+
+def _sample_entropy_outputs(sampen, record, required, fs):
+    if sampen is None:
+        sampen = np.nan
+    return {}, {"Acc_euclidean": {"sampen": [sampen, 0, 0]}}
+
+
+def _ldlj_task(data, channels, last_step_index, gyro, fallback):
+    if fallback == "cap":
+        last_step_index = min(last_step_index, time_budget.MAX_SAMPLES)
+    return log_dimensionless_jerk_imu(data, channels, event=last_step_index, gyro=gyro)
+
+
+def _ldlj_outputs(ldlj, record, required, fs):
+    if ldlj is None:
+        ldlj = np.nan
+    return {}, {"Acc_euclidean": {"ldlj": [ldlj, 0, 0]}}
+
+
+def _symmetry_task(norm, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    return symmetry_norm(norm)
+
+
+def _symmetry_outputs(result, record, required, fs):
+    if result is None:
+        result = (-999, -999, -999, -999, np.array([]))
+    d_1, ad_1, d_2, ad_2, autocorr = result
+
+    return {"Autocorrelation": autocorr}, {"Autocorrelation": {
+        "d1": [int(d_1), 0, 0],
+        "d2": [int(d_2), 0, 0],
+        "ad1": [float(ad_1), 0, 0],
+        "ad2": [float(ad_2), 0, 0]
+    }}
+
+
+def _divergence_task(norm, fs, trial, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    if LyE.APPROXIMATE or fallback == "approximate":
+        return LyE.approximate_divergence_curves(norm, fs, trial, fallback=fallback == "approximate")
+    return LyE.divergence_curve(norm, trial)
+
+
+def _divergence_outputs(curves, record, required, fs, channel="Divergence"):
+    symmetry_result = required["symmetry"]
+    d_2 = symmetry_result[2] if symmetry_result is not None else -999
+
+    lds, AveLnDiv, lds_ci = [np.nan, np.nan], np.array([]), None
+    if curves is not None and d_2 <= 0:
+        # without a stride time the fit windows are meaningless
+        print('WARNING: no stride time found, divergence exponents skipped')
+        record["fallback"] = "skip"
+    elif curves is not None and np.ndim(curves) == 2:
+        lds, AveLnDiv, lds_ci = LyE.approximate_lds(curves, d_2, fs)
+    elif curves is not None:
+        lds, AveLnDiv = LyE.fit_lds(curves, d_2, fs), curves
+
+    events = {
+        "LyEs": [float(lds[0]), 0, 0],
+        "LyEl": [float(lds[1]), 0, 0]
+    }
+    if lds_ci is not None:
+        events.update({
+            "LyEs_low": [float(lds_ci[0][0]), 0, 0],
+            "LyEs_high": [float(lds_ci[0][1]), 0, 0],
+            "LyEl_low": [float(lds_ci[1][0]), 0, 0],
+            "LyEl_high": [float(lds_ci[1][1]), 0, 0]
+        })
+
+    return {channel: AveLnDiv}, {channel: events}
+
+
+def _multivariate_sample_entropy_task(lines, fallback):
+    if fallback == "cap":
+        lines = lines[:time_budget.MAX_SAMPLES]
+    return multivariate_sample_entropy(lines)
+
+
+def _multivariate_sample_entropy_outputs(sampen, record, required, fs):
+    if sampen is None:
+        sampen = np.nan
+    return {}, {"Acc_x": {"msampen": [sampen, 0, 0]}}
+
+
+def _triaxial_divergence_task(lines, norm, trial, fallback):
+    if fallback == "cap":
+        lines, norm = lines[:time_budget.MAX_SAMPLES], norm[:time_budget.MAX_SAMPLES]
+    return LyE.divergence_curve_triaxial(lines, norm, trial)
+
+
+def _triaxial_divergence_outputs(curves, record, required, fs):
+    return _divergence_outputs(curves, record, required, fs, channel="Divergence_triaxial")
+
+
+def _cross_sample_entropy_task(lines, channels, fallback):
+    if fallback == "cap":
+        lines = lines[:time_budget.MAX_SAMPLES]
+    pairs = [(i, j) for i in range(len(channels)) for j in range(i + 1, len(channels))]
+    xsampen = cross_sample_entropy_pairs([lines[:, i] for i in range(len(channels))], pairs)
+    return {(channels[i], channels[j]): value for (i, j), value in zip(pairs, xsampen)}
+
+
+def _cross_sample_entropy_outputs(xsampen, record, required, fs):
+    events = {}
+    for (ch, other), value in (xsampen or {}).items():
+        events.setdefault(ch, {})[EVENT_PREFIX + other] = [value, 0, 0]
+    return {}, events
+
+
+def _dfa_task(norm, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    return dfa(norm)
+
+
+def _dfa_outputs(result, record, required, fs):
+    if result is None:
+        return {}, {}
+    alpha, scales, fluctuation = result
+    # window size in samples and fluctuation, side by side
+    return {"Fluctuation": np.column_stack((scales, fluctuation))}, {"Fluctuation": {"alpha": [float(alpha), 0, 0]}}
+
+
+def _rqa_task(norm, trial, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    return rqa(norm, trial=trial)
+
+
+def _rqa_outputs(result, record, required, fs):
+    if result is None:
+        result = ({"RR": np.nan, "DET": np.nan, "LAM": np.nan, "L": np.nan}, np.array([]))
+    measures, diagonal = result
+    return {"Recurrence": diagonal}, {"Recurrence": {m: [float(v), 0, 0] for m, v in measures.items()}}
+
+
+def _steps_task(norm, data, channels, fs, gyro, fallback):
+    if fallback == "cap":
+        norm = norm[:time_budget.MAX_SAMPLES]
+    steps = detect_steps(norm, fs)
+    return (steps,) + stride_metrics(data, channels, steps, gyro)
+
+
+def _steps_outputs(result, record, required, fs):
+    if result is None:
+        return {}, {}
+    steps, measures, stride_times, ldlj = result
+
+    # the foot strikes as events step1, step2, ... of the signal they were detected in
+    events = {"Acc_euclidean": {"step{0}".format(i + 1): [int(step), 0, 0] for i, step in enumerate(steps)},
+              "Strides": {m: [float(v), 0, 0] for m, v in measures.items()}}
+    # stride time in s and LDLJ of each stride, side by side
+    return {"Strides": np.column_stack((stride_times, ldlj))}, events
+
+
+# The metrics, in the order their columns are written. The keys are the names used in SELECTED, TIME_BUDGETS and
+# FALLBACKS. "label" is the prefix of the time budget columns. Metrics with "default": False are only calculated when
+# they are selected.
+METRICS = {
+    "sample_entropy": {
+        "task": _sample_entropy_task,
+        "inputs": ["norm"],
+        "requires": [],
+        "outputs": _sample_entropy_outputs,
+        "columns": {"SampleEntropy": ("Acc_euclidean", "sampen")},
+        "label": "SampleEntropy",
+    },
+    "log_dimensionless_jerk_imu": {
+        "task": _ldlj_task,
+        "inputs": ["data", "channels", "last_step_index", "gyro"],
+        "requires": [],
+        "outputs": _ldlj_outputs,
+        "columns": {"LDLJ": ("Acc_euclidean", "ldlj")},
+        "label": "LDLJ",
+    },
+    "symmetry": {
+        "task": _symmetry_task,
+        "inputs": ["norm"],
+        "requires": [],
+        "outputs": _symmetry_outputs,
+        "columns": {"StepSymmetry": ("Autocorrelation", "ad1"),
+                    "StrideSymmetry": ("Autocorrelation", "ad2")},
+        "label": "Symmetry",
+    },
+    "LyE_R": {
+        "task": _divergence_task,
+        "inputs": ["norm", "fs", "trial"],
+        "requires": ["symmetry"],  # the stride time sets the fit windows
+        "outputs": _divergence_outputs,
+        "columns": {"LyE_s": ("Divergence", "LyEs"),
+                    "LyE_l": ("Divergence", "LyEl")},
+        # confidence intervals of LyE.APPROXIMATE and the "approximate" fallback
+        "optional_columns": {"LyE_s_low": ("Divergence", "LyEs_low"),
+                             "LyE_s_high": ("Divergence", "LyEs_high"),
+                             "LyE_l_low": ("Divergence", "LyEl_low"),
+                             "LyE_l_high": ("Divergence", "LyEl_high")},
+        "label": "LyE",
+    },
+    "multivariate_sample_entropy": {
+        "task": _multivariate_sample_entropy_task,
+        "inputs": ["lines"],
+        "requires": [],
+        "outputs": _multivariate_sample_entropy_outputs,
+        "columns": {"MultivariateSampleEntropy": ("Acc_x", "msampen")},
+        "label": "MultivariateSampleEntropy",
+        "default": False,
+    },
+    "LyE_R_triaxial": {
+        "task": _triaxial_divergence_task,
+        "inputs": ["lines", "norm", "trial"],
+        "requires": ["symmetry"],
+        "outputs": _triaxial_divergence_outputs,
+        "columns": {"LyE_s_triaxial": ("Divergence_triaxial", "LyEs"),
+                    "LyE_l_triaxial": ("Divergence_triaxial", "LyEl")},
+        "label": "LyETriaxial",
+        "default": False,
+    },
+    # coupling between the acceleration directions
+    "cross_sample_entropy": {
+        "task": _cross_sample_entropy_task,
+        "inputs": ["lines", "channels"],
+        "requires": [],
+        "outputs": _cross_sample_entropy_outputs,
+        "columns": {"CrossSampleEntropy_xy": ("Acc_x", EVENT_PREFIX + "Acc_y"),
+                    "CrossSampleEntropy_xz": ("Acc_x", EVENT_PREFIX + "Acc_z"),
+                    "CrossSampleEntropy_yz": ("Acc_y", EVENT_PREFIX + "Acc_z")},
+        "label": "CrossSampleEntropy",
+        "default": False,
+    },
+    "dfa": {
+        "task": _dfa_task,
+        "inputs": ["norm"],
+        "requires": [],
+        "outputs": _dfa_outputs,
+        "columns": {"DFA_alpha": ("Fluctuation", "alpha")},
+        "label": "DFA",
+        "default": False,
+    },
+    # in the state space of LyE_R, the embedding parameters are estimated once for both
+    "rqa": {
+        "task": _rqa_task,
+        "inputs": ["norm", "trial"],
+        "requires": [],
+        "outputs": _rqa_outputs,
+        "columns": {"RQA_RR": ("Recurrence", "RR"),
+                    "RQA_DET": ("Recurrence", "DET"),
+                    "RQA_LAM": ("Recurrence", "LAM"),
+                    "RQA_L": ("Recurrence", "L")},
+        "label": "RQA",
+        "default": False,
+    },
+    "steps": {
+        "task": _steps_task,
+        "inputs": ["norm", "data", "channels", "fs", "gyro"],
+        "requires": [],
+        "outputs": _steps_outputs,
+        "columns": {"StrideTime": ("Strides", "stride_time"),
+                    "StrideTimeCV": ("Strides", "stride_time_cv"),
+                    "StepTimeCV": ("Strides", "step_time_cv"),
+                    "StrideLDLJ": ("Strides", "ldlj_stride"),
+                    "StrideDFA_alpha": ("Strides", "stride_dfa_alpha")},
+        "label": "Steps",
+        "default": False,
+    },
+}
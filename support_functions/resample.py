@@ -0,0 +1,48 @@
+from fractions import Fraction
+
+import numpy as np
+
+# Some hardcoded values
+# Sample rate in Hz that trials are resampled to before the analysis, e.g. 100 for exports recorded at 200-500 Hz.
+# Sample entropy and the neighbour search of LyE_R scale quadratically with the number of samples. None keeps the
+# sample rate of the recording.
+TARGET_RATE = None
+MAX_DENOMINATOR = 1000  # limits the up and down factors of a non-integer rate ratio
+
+
+def resample(data, rate=None):
+    """
+    Resamples the channels of a trial to another sample rate, with the polyphase anti-alias filter of
+    scipy.signal.resample_poly. All channels are filtered at once. The signal is extended linearly at both ends before
+    filtering, so that the gravity offset of the accelerations does not cause transients at the edges. The events of
+    the channels and the frame rate in the zoosystem are rescaled to the new rate.
+
+    :param data: dict. The zoo data of a trial, with channels of equal length, as returned by build_zoo.
+    :param rate: int or float. Target sample rate in Hz. Default is TARGET_RATE.
+    :return: data: the zoo data at the new rate. Unchanged if rate is None or equal to the current rate.
+    """
+    if rate is None:
+        rate = TARGET_RATE
+    fs = data["zoosystem"]["Video"]["Freq"]
+    if rate is None or rate == fs:
+        return data
+
+    from scipy.signal import resample_poly
+
+    ratio = Fraction(rate / fs).limit_denominator(MAX_DENOMINATOR)
+    up, down = ratio.numerator, ratio.denominator
+
+    chns = data["zoosystem"]["Video"]["Channels"]
+    lines = np.column_stack([np.asarray(data[ch]["line"], dtype=float) for ch in chns])
+    lines = resample_poly(lines, up, down, axis=0, padtype='line')
+    n = len(lines)
+
+    for i, ch in enumerate(chns):
+        data[ch]["line"] = lines[:, i]
+        for event in data[ch]["event"].values():
+            event[0] = min(int(round(event[0] * up / down)), n)
+
+    freq = fs * up / down
+    data["zoosystem"]["Video"]["Freq"] = int(freq) if float(freq).is_integer() else freq
+
+    return data
@@ -0,0 +1,142 @@
+import sqlite3
+
+from support_functions import LyE, sample_entropy, symmetry, resample, embedding_cache, dfa, rqa, steps, registry
+from support_functions.zoo2excel import COLUMNS, write_results
+
+# Some hardcoded values
+KEYS = ["Subject_ID", "Surface", "ParameterSet"]
+TIMEOUT = 60  # seconds to wait for the database lock
+
+
+def parameter_set():
+    """
+    Describes the parameters of the metrics, so that results computed with different parameters are kept apart.
+
+    :return: str. e.g. "TOL=0.2,DIM=2,MIN_DISTANCE=30,MIN_HEIGHT=0.1,WS=10". The settings of the approximate
+    divergence exponents are added when LyE.APPROXIMATE is set, the sample rate the trials are resampled to when
+    resample.TARGET_RATE is set, and the policy of the embedding parameter cache when it is set, since reused or
+    cohort parameters change the divergence exponents and RQA. The parameters of the metrics that are not calculated by
+    default are added when they are selected, see registry.selected_metrics.
+    """
+    selected = registry.selected_metrics()
+    parameters = {
+        "TOL": sample_entropy.TOL,
+        "DIM": sample_entropy.DIM,
+        "MIN_DISTANCE": symmetry.MIN_DISTANCE,
+        "MIN_HEIGHT": symmetry.MIN_HEIGHT,
+        "WS": LyE.WS,
+    }
+    if LyE.APPROXIMATE:
+        parameters.update({
+            "APPROX_REFERENCES": LyE.APPROX_REFERENCES,
+            "APPROX_EPS": LyE.APPROX_EPS,
+            "APPROX_BOOTSTRAP": LyE.APPROX_BOOTSTRAP,
+            "APPROX_SEED": LyE.APPROX_SEED,
+        })
+    if resample.TARGET_RATE is not None:
+        parameters["TARGET_RATE"] = resample.TARGET_RATE
+    if embedding_cache.CACHE_FILE is not None:
+        parameters["EMBEDDING_POLICY"] = embedding_cache.POLICY
+        if embedding_cache.POLICY == "reuse":
+            parameters["SIMILARITY"] = embedding_cache.SIMILARITY
+        elif embedding_cache.POLICY == "cohort":
+            parameters["COHORT_MIN_TRIALS"] = embedding_cache.COHORT_MIN_TRIALS
+    if "rqa" in selected:
+        parameters.update({
+            "RADIUS": rqa.RADIUS,
+            "LMIN": rqa.LMIN,
+            "VMIN": rqa.VMIN,
+        })
+    # the DFA alpha of the stride times uses the window sizes of dfa as well
+    if "dfa" in selected or "steps" in selected:
+        parameters.update({
+            "ORDER": dfa.ORDER,
+            "MIN_SCALE": dfa.MIN_SCALE,
+            "MAX_SCALE_DIVISOR": dfa.MAX_SCALE_DIVISOR,
+            "N_SCALES": dfa.N_SCALES,
+        })
+    if "steps" in selected:
+        parameters.update({
+            "MIN_STEP_TIME": steps.MIN_STEP_TIME,
+            "PROMINENCE": steps.PROMINENCE,
+            "DFA_MIN_STRIDES": steps.DFA_MIN_STRIDES,
+        })
+    return ",".join("{0}={1}".format(k, v) for k, v in parameters.items())
+
+
+def connect_results(db):
+    """
+    Opens the results database, and creates it if it does not exist yet. Each row holds the results of one trial,
+    keyed by subject, surface and parameter set, with indices on subject and surface. Columns for new results are
+    added when they are first upserted.
+
+    :param db: str. Full path to the database file.
+    :return: sqlite3.Connection
+    """
+    conn = sqlite3.connect(db, timeout=TIMEOUT)
+    conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                 "Subject_ID TEXT NOT NULL, Surface TEXT NOT NULL, ParameterSet TEXT NOT NULL, "
+                 "PRIMARY KEY (Subject_ID, Surface, ParameterSet))")
+    conn.execute("CREATE INDEX IF NOT EXISTS results_subject ON results (Subject_ID)")
+    conn.execute("CREATE INDEX IF NOT EXISTS results_surface ON results (Surface)")
+    conn.commit()
+    return conn
+
+
+def upsert_results(conn, row, parameters=None):
+    """
+    Inserts the results of one trial, or updates them if the trial was stored before with the same parameters.
+
+    :param conn: sqlite3.Connection to the results database.
+    :param row: dict. One row of results, as returned by extract_results.
+    :param parameters: str. Parameter set of the results. Default is the current parameter_set().
+    :return: None
+    """
+    if parameters is None:
+        parameters = parameter_set()
+
+    columns = [c for c in row if c not in KEYS]
+    existing = _columns(conn)
+    for c in columns:
+        if c not in existing:
+            # no declared type, so that integers and floats are returned as they were stored
+            conn.execute('ALTER TABLE results ADD COLUMN "{0}"'.format(c))
+
+    names = KEYS + columns
+    values = [row["Subject_ID"], row["Surface"], parameters] + [row[c] for c in columns]
+    update = ", ".join('"{0}" = excluded."{0}"'.format(c) for c in columns) or "Subject_ID = excluded.Subject_ID"
+    conn.execute('INSERT INTO results ({0}) VALUES ({1}) ON CONFLICT (Subject_ID, Surface, ParameterSet) '
+                 'DO UPDATE SET {2}'.format(", ".join('"{0}"'.format(c) for c in names),
+                                            ", ".join("?" * len(names)), update), values)
+    conn.commit()
+
+
+def export_csv(conn, fld_stats, parameters=None):
+    """
+    Writes the stored results of a parameter set to results.csv in the stats folder, in the same format as zoo2excel.
+
+    :param conn: sqlite3.Connection to the results database.
+    :param fld_stats: full path to stats folder
+    :param parameters: str. Parameter set to export. Default is the current parameter_set().
+    :return: int. Number of trials written.
+    """
+    if parameters is None:
+        parameters = parameter_set()
+
+    existing = _columns(conn)
+    columns = [c for c in COLUMNS if c in existing] + [c for c in existing if c not in COLUMNS and c not in KEYS]
+    cur = conn.execute('SELECT {0} FROM results WHERE ParameterSet = ? ORDER BY Subject_ID, Surface'.format(
+        ", ".join('"{0}"'.format(c) for c in columns)), (parameters,))
+    # columns that only other parameter sets have are left out
+    rows = [{c: v for c, v in zip(columns, values) if v is not None or c in COLUMNS} for values in cur.fetchall()]
+
+    write_results(rows, fld_stats)
+
+    return len(rows)
+
+
+def _columns(conn):
+    """
+    :return: list of the column names of the results table.
+    """
+    return [info[1] for info in conn.execute("PRAGMA table_info(results)").fetchall()]
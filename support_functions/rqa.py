@@ -0,0 +1,94 @@
+import numpy as np
+
+from support_functions.delay_embedding import delay_embedding
+from support_functions.LyE import embedding_parameters
+from support_functions.time_budget import check_deadline
+
+# Some hardcoded values
+# Marwan, N., Romano, M. C., Thiel, M., & Kurths, J. (2007). Recurrence plots for the analysis of complex systems.
+# Physics Reports, 438(5-6), 237-329.
+RADIUS = 0.5  # points recur within this fraction of the standard deviation of the signal, about 1-2% of point pairs
+LMIN = 2  # shortest diagonal line counted for determinism
+VMIN = 2  # shortest vertical line counted for laminarity
+
+
+def rqa(norm, tau=None, dim=None, trial=None):
+    """
+    Recurrence quantification analysis of a signal that is already cut to length, in the state space of LyE_R. Two
+    points of the state space recur if they are less than RADIUS times the standard deviation of the signal apart. The
+    recurrences are found with radius queries on a kd-tree and kept as a sparse matrix, and the lengths of the
+    diagonal and vertical lines are read from the sorted indices of the recurrences, so the N x N recurrence matrix is
+    never built. The line of identity is left out.
+
+    :param norm: the Euclidean norm of the three acceleration signals.
+    :param tau: time delay in samples. Default is the one of embedding_parameters, which LyE_R uses as well.
+    :param dim: embedding dimension. Default is the one of embedding_parameters.
+    :param trial: (subject, surface) of the trial, for the cache of the embedding parameters, see embedding_parameters.
+    :return: measures: dict with the recurrence rate "RR", determinism "DET", laminarity "LAM" and mean diagonal line
+    length "L". NaN if there are no recurrences or lines.
+            diagonal: histogram of the diagonal line lengths, the number of lines of length 1, 2, ...
+    """
+    if tau is None or dim is None:
+        tau, dim = embedding_parameters(norm, trial)
+    Y = delay_embedding(norm, dim, tau)
+    M = np.shape(Y)[0]
+
+    R = recurrence_matrix(Y, RADIUS * np.std(norm))
+    check_deadline()
+
+    # lines parallel to the line of identity, in the upper triangle. The lower triangle has the same lines
+    diagonal = _line_lengths(R.col - R.row, R.row)
+    # vertical lines, over both triangles
+    vertical = _line_lengths(np.concatenate((R.col, R.row)), np.concatenate((R.row, R.col)))
+
+    lengths = np.arange(len(diagonal))
+    n_recurrences = 2 * R.nnz
+    in_diagonal = np.sum(lengths[LMIN:] * diagonal[LMIN:])
+    in_vertical = np.sum(np.arange(len(vertical))[VMIN:] * vertical[VMIN:])
+    n_lines = np.sum(diagonal[LMIN:])
+
+    measures = {
+        "RR": n_recurrences / (M * (M - 1)),
+        "DET": 2 * in_diagonal / n_recurrences if n_recurrences else np.nan,
+        "LAM": in_vertical / n_recurrences if n_recurrences else np.nan,
+        "L": in_diagonal / n_lines if n_lines else np.nan,
+    }
+
+    return measures, diagonal[1:]
+
+
+def recurrence_matrix(Y, radius):
+    """
+    Finds the recurrences of the points of a state space with a kd-tree.
+
+    :param Y: (M x dim) embedded signal.
+    :param radius: float. Points recur if their Euclidean distance is at most radius.
+    :return: scipy.sparse.coo_matrix. (M x M) upper triangle of the recurrence matrix, without the line of identity.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.spatial import cKDTree
+
+    M = np.shape(Y)[0]
+    pairs = cKDTree(Y).query_pairs(radius, output_type='ndarray')
+    return coo_matrix((np.ones(len(pairs), dtype=bool), (pairs[:, 0], pairs[:, 1])), shape=(M, M))
+
+
+# embedded functions
+def _line_lengths(line, position):
+    """
+    Histogram of the lengths of the lines of consecutive recurrences.
+
+    :param line: index of the line each recurrence is on, e.g. its diagonal or column.
+    :param position: index of each recurrence along its line.
+    :return: number of lines of each length, from length 0.
+    """
+    if len(line) == 0:
+        return np.zeros(1, dtype=int)
+
+    order = np.lexsort((position, line))
+    line, position = line[order], position[order]
+    # a new line starts where the line changes or a recurrence is skipped
+    starts = np.flatnonzero(np.r_[True, (np.diff(line) != 0) | (np.diff(position) != 1)])
+    lengths = np.diff(np.r_[starts, len(line)])
+
+    return np.bincount(lengths)
@@ -1,6 +1,9 @@
 import numpy as np
 import math
+from support_functions.delay_embedding import delay_embedding
 from support_functions.euclidean_norm import euclidean_norm
+from support_functions.range_count import kd_tree, range_count, range_pairs
+from support_functions.time_budget import check_deadline
 
 # some hard coded variables
 # Yentes, J. M., Hunt, N., Schmid, K. K., Kaipust, J. P., McGrath, D., & Stergiou, N. (2013).
@@ -13,6 +16,8 @@ DIM = 2
 def sample_entropy(data, ch, **kwargs):
     """
     This function calculates the sample entropy of a given signal. The tolerance is set at 0.2 with a dimension of 2.
+    The templates are compared one element at a time on a delay embedding of the signal, so the memory use grows
+    linearly with the signal length.
 
     :param data: dictionary containing all data.
     :param data: dictionary containing all data.
@@ -29,50 +34,110 @@ def sample_entropy(data, ch, **kwargs):
         event = kwargs.get("event")
         norm = norm[:event]
 
+    return sample_entropy_norm(norm), norm
+
+
+def sample_entropy_norm(norm):
+    """
+    Calculates the sample entropy of a signal that is already cut to length, see sample_entropy.
+
+    :param norm: the Euclidean norm of the three acceleration signals.
+    :return: sampen; a single float of the calculated sample entropy.
+    """
     N = len(norm)
     r = TOL * np.std(norm)
     m = DIM
 
+    # the templates of length m and m + 1 are views on the signal, see delay_embedding
     # calculate B_i
-    matches = np.zeros((m, N)) * np.nan
-    for i in range(m):
-        matches[i, :N - i] = norm[i:]
+    B_i = (_count_matches(delay_embedding(norm, m), r, N - 1) / (N - m)) / (N - m)
 
-    matches = matches.T
-    matches_total = np.zeros((matches.shape[0] - 1))
+    # calculate A_i
+    A_i = (_count_matches(delay_embedding(norm, m + 1), r, N - 2) / (N - (m + 1))) / (N - m)
 
-    for i in range(matches.shape[0] - 1):
-        lower_bounds = matches[i, :] - r
-        upper_bounds = matches[i, :] + r
+    # Calculate sample entropy
+    A = (((N - m - 1) * (N - m)) / 2) * A_i
+    B = (((N - m - 1) * (N - m)) / 2) * B_i
 
-        match_is_in_range = np.sum((matches >= lower_bounds) & (matches <= upper_bounds), axis=1)
-        matches_total[i] = np.sum(match_is_in_range == m) - 1
+    sampen = -math.log(A / B)
 
-    B_i = (np.sum(matches_total) / (N - m)) / (N - m)
+    return sampen
 
-    del matches, matches_total
 
-    # calculate A_i
-    matches = np.zeros((m + 1, N)) * np.nan
-    for i in range(m + 1):
-        matches[i, :N - i] = norm[i:]
+def multivariate_sample_entropy(lines):
+    """
+    Calculates the multivariate sample entropy of signals that are already cut to length, e.g. the three acceleration
+    directions, so that the direction of the accelerations is not lost as in the Euclidean norm. Each signal is
+    normalised to unit variance and embedded with a dimension of DIM, and the tolerance is TOL times the number of
+    signals. The templates of length DIM + 1 extend one signal at a time, and are all compared with each other.
 
-    matches = matches.T
-    matches_total = np.zeros((matches.shape[0] - 1))
+    Two templates that are extended by the same signal only match if their templates of length DIM match, so these
+    matches are found among the matching pairs of templates of length DIM, see range_pairs, by comparing their extra
+    sample. Only the templates extended by different signals are compared in full, with a kd-tree per signal, see
+    range_count.
 
-    for i in range(matches.shape[0] - 2):
-        lower_bounds = matches[i, :] - r
-        upper_bounds = matches[i, :] + r
+    Ahmed, M. U., & Mandic, D. P. (2011). Multivariate multiscale entropy: A tool for complexity analysis of
+    multichannel data. Physical Review E, 84(6), 061918.
 
-        match_is_in_range = np.sum((matches >= lower_bounds) & (matches <= upper_bounds), axis=1)
-        matches_total[i] = np.sum(match_is_in_range == m + 1) - 1
+    :param lines: (N x p) array with one signal per column.
+    :return: sampen; a single float of the calculated multivariate sample entropy.
+    """
+    X = np.asarray(lines, dtype=float)
+    X = (X - np.mean(X, axis=0)) / np.std(X, axis=0)
+    N, p = np.shape(X)
+    r = TOL * p
+    m = DIM
+    n = N - m  # number of templates of both lengths
 
-    A_i = (np.sum(matches_total) / (N - (m + 1))) / (N - m)
+    # the (n x m + 1) templates of each signal, of which the first m samples form the templates of length m
+    embedded = [delay_embedding(X[:, k], m + 1) for k in range(p)]
+    templates = np.hstack([e[:, :m] for e in embedded])
 
-    # Calculate sample entropy
-    A = (((N - m - 1) * (N - m)) / 2) * A_i
-    B = (((N - m - 1) * (N - m)) / 2) * B_i
+    # matches of the templates of length m, and of the templates extended by the same signal
+    n_m, n_m1 = 0, 0
+    for i, j in range_pairs(templates, r):
+        n_m += len(i)
+        n_m1 += sum(np.count_nonzero(np.abs(e[i, m] - e[j, m]) <= r) for e in embedded)
+
+    # matches of the templates extended by different signals
+    extended = [np.hstack([e[:, :m + (j == k)] for j, e in enumerate(embedded)]) for k in range(p)]
+    for k in range(p - 1):
+        tree = kd_tree(extended[k])
+        n_m1 += sum(range_count(extended[other], r, tree) for other in range(k + 1, p))
+
+    # probability that two templates match, for each length
+    B = n_m / (n * (n - 1) / 2)
+    A = n_m1 / (p * n * (p * n - 1) / 2)
 
     sampen = -math.log(A / B)
 
-    return sampen, norm
+    return sampen
+
+
+def _count_matches(templates, r, n_templates):
+    """
+    Counts the template matches for the first n_templates templates, one template element at a time, so that no
+    (N x m) comparison matrices are built. Templates that run past the end of the signal never match, so they count as
+    -1, the same as in the NaN padded match matrix of the original implementation.
+
+    :param templates: (N - m + 1 x m) delay embedding of the signal.
+    :param r: tolerance.
+    :param n_templates: number of templates to compare against all others.
+    :return: the total number of matches, excluding self-matches.
+    """
+    n_valid, m = np.shape(templates)
+    total = 0
+
+    for i in range(n_templates):
+        check_deadline()
+        if i >= n_valid:
+            total -= 1
+            continue
+
+        is_match = np.ones(n_valid, dtype=bool)
+        for k in range(m):
+            segment = templates[:, k]
+            is_match &= (segment >= templates[i, k] - r) & (segment <= templates[i, k] + r)
+        total += np.count_nonzero(is_match) - 1
+
+    return total
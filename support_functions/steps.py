@@ -0,0 +1,67 @@
+import numpy as np
+
+from support_functions.dfa import dfa
+from support_functions.ldlj import log_dimensionless_jerk_strides
+
+# Some hardcoded values
+MIN_STEP_TIME = 0.35  # s, shortest time between two foot strikes, i.e. at most 171 steps per minute
+PROMINENCE = 0.5  # how far a foot strike stands out of the Euclidean norm, in standard deviations
+# Fewer stride times than this give no reliable DFA alpha, which is then NaN
+DFA_MIN_STRIDES = 64
+
+
+def detect_steps(norm, fs):
+    """
+    Detects the foot strikes as the peaks of the Euclidean norm of the accelerations that are at least MIN_STEP_TIME
+    apart and stand out by at least PROMINENCE standard deviations, with scipy.signal.find_peaks as in symmetry.
+
+    :param norm: the Euclidean norm of the three acceleration signals, already cut to length.
+    :param fs: sample rate in Hz.
+    :return: array with the sample of each foot strike.
+    """
+    from scipy.signal import find_peaks
+
+    norm = np.asarray(norm, dtype=float)
+    steps, _ = find_peaks(norm, distance=max(int(MIN_STEP_TIME * fs), 1), prominence=PROMINENCE * np.std(norm))
+
+    return steps
+
+
+def stride_metrics(data, ch, steps, gyro=None):
+    """
+    Calculates the metrics of all strides of a trial at once. A stride runs from a foot strike to the next foot strike
+    of the same foot, i.e. two steps further, and the strides follow each other without overlap.
+
+    :param data: dictionary containing all data.
+    :param ch: list of strings that provide the names three acceleration direction.
+    :param steps: array with the sample of each foot strike, see detect_steps.
+    :param gyro: list of strings that provide the names of the three angular velocity directions, or None, see
+    log_dimensionless_jerk_imu.
+    :return: measures: dict with the mean "stride_time" in s, the coefficients of variation of the stride and step times
+    "stride_time_cv" and "step_time_cv", the mean LDLJ of the strides "ldlj_stride" and the DFA alpha of the stride
+    times "stride_dfa_alpha". NaN if there are too few steps.
+            stride_times: the time of each stride in s.
+            ldlj: the LDLJ of each stride.
+    """
+    fs = data["zoosystem"]["Video"]["Freq"]
+    steps = np.asarray(steps, dtype=int)
+    strides = np.column_stack((steps[:-2:2], steps[2::2]))
+
+    if len(strides) < 2:
+        measures = {m: np.nan for m in ["stride_time", "stride_time_cv", "step_time_cv", "ldlj_stride",
+                                        "stride_dfa_alpha"]}
+        return measures, np.array([]), np.array([])
+
+    step_times = np.diff(steps) / fs
+    stride_times = np.diff(strides, axis=1)[:, 0] / fs
+    ldlj = log_dimensionless_jerk_strides(data, ch, strides, gyro)
+
+    measures = {
+        "stride_time": np.mean(stride_times),
+        "stride_time_cv": np.std(stride_times) / np.mean(stride_times),
+        "step_time_cv": np.std(step_times) / np.mean(step_times),
+        "ldlj_stride": np.mean(ldlj),
+        "stride_dfa_alpha": dfa(stride_times)[0] if len(stride_times) >= DFA_MIN_STRIDES else np.nan,
+    }
+
+    return measures, stride_times, ldlj
@@ -0,0 +1,180 @@
+import socket
+import sys
+import time
+
+import numpy as np
+
+from support_functions.ldlj import log_dimensionless_jerk_imu
+from support_functions.sample_entropy import sample_entropy
+from support_functions.setZoosystem import setZoosystem
+from support_functions.symmetry import symmetry
+
+# Some hardcoded values
+CHANNELS = ["Acc_x", "Acc_y", "Acc_z"]
+SAMPLE_RATE = 100  # Hz
+WINDOW = 10  # seconds of signal that LDLJ and symmetry are calculated over
+SAMPEN_WINDOW = 5  # seconds of signal that sample entropy is calculated over, the most expensive metric
+CADENCE = 1  # seconds between updates
+POLL = 0.05  # seconds between reads when following a file that has no new samples
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer that keeps the most recent samples of a multichannel signal. Adding samples and reading the
+    window both cost at most the size of the buffer, however long the stream runs.
+    """
+
+    def __init__(self, size, channels=3):
+        self.buffer = np.zeros((size, channels))
+        self.size = size
+        self.count = 0  # total number of samples pushed
+
+    def push(self, samples):
+        """
+        Adds samples, an (n x channels) array, overwriting the oldest ones when the buffer is full.
+        """
+        samples = np.atleast_2d(samples)[-self.size:]
+        idx = (self.count + np.arange(len(samples))) % self.size
+        self.buffer[idx] = samples
+        self.count += len(samples)
+
+    def window(self, n=None):
+        """
+        Returns the last n samples (default: all that are available) in chronological order.
+        """
+        available = min(self.count, self.size)
+        n = available if n is None else min(n, available)
+        idx = (self.count - n + np.arange(n)) % self.size
+        return self.buffer[idx]
+
+
+def analyse_window(window, fs, sampen_samples):
+    """
+    Calculates the LDLJ, step and stride symmetry, and sample entropy of a window of accelerations with the same
+    functions as the batch analysis.
+
+    :param window: (n x 3) array of accelerations.
+    :param fs: sample rate in Hz.
+    :param sampen_samples: number of samples at the end of the window to calculate sample entropy over.
+    :return: dict with ldlj, step_symmetry, stride_symmetry and sampen.
+    """
+    data = {'zoosystem': setZoosystem('stream')}
+    data['zoosystem']['Video']['Freq'] = fs
+    for i, ch in enumerate(CHANNELS):
+        data[ch] = {'line': window[:, i], 'event': {}}
+
+    ldlj = log_dimensionless_jerk_imu(data, CHANNELS, event=len(window))
+    _, ad_1, _, ad_2, _ = symmetry(data, CHANNELS, event=len(window))
+
+    for i, ch in enumerate(CHANNELS):
+        data[ch]['line'] = window[-sampen_samples:, i]
+    sampen, _ = sample_entropy(data, CHANNELS, event=sampen_samples)
+
+    return {'ldlj': float(ldlj), 'step_symmetry': float(ad_1), 'stride_symmetry': float(ad_2),
+            'sampen': float(sampen)}
+
+
+def run_stream(source, fs=SAMPLE_RATE, window=WINDOW, sampen_window=SAMPEN_WINDOW, cadence=CADENCE, emit=None):
+    """
+    Analyses a live stream of accelerations. Samples are kept in a ring buffer of the last `window` seconds and every
+    `cadence` seconds of signal the metrics are calculated over the buffer, so that the cost of each update is bounded
+    by the window size and does not grow with the length of the recording.
+
+    :param source: where the samples come from, see read_samples.
+    :param fs: sample rate in Hz.
+    :param window: seconds of signal for LDLJ and symmetry.
+    :param sampen_window: seconds of signal for sample entropy.
+    :param cadence: seconds of signal between updates.
+    :param emit: function called with a dict of results for every update. Default prints a csv line.
+    :return: None
+    """
+    if emit is None:
+        emit = print_update
+
+    window_samples = int(window * fs)
+    sampen_samples = min(int(sampen_window * fs), window_samples)
+    cadence_samples = max(int(cadence * fs), 1)
+    buffer = RingBuffer(window_samples, len(CHANNELS))
+
+    next_update = window_samples
+    for sample in read_samples(source):
+        buffer.push(sample)
+        if buffer.count < next_update:
+            continue
+
+        start_time = time.time()
+        try:
+            results = analyse_window(buffer.window(), fs, sampen_samples)
+        except (ValueError, ZeroDivisionError, IndexError) as e:
+            # e.g. no matches for sample entropy, or too few autocorrelation peaks, in a window without walking
+            results = {'error': str(e)}
+        results['time'] = buffer.count / fs
+        results['latency'] = time.time() - start_time
+        emit(results)
+
+        if results['latency'] > cadence:
+            print('WARNING: update took {0:.2f} s, longer than the cadence of {1} s'.format(
+                results['latency'], cadence), file=sys.stderr)
+        next_update = buffer.count + cadence_samples
+
+
+def print_update(results):
+    """
+    Prints the results of an update as a csv line: time, ldlj, step symmetry, stride symmetry, sampen, latency.
+    """
+    print(','.join('{0:.6g}'.format(results.get(k, np.nan)) for k in
+                   ['time', 'ldlj', 'step_symmetry', 'stride_symmetry', 'sampen', 'latency']), flush=True)
+
+
+def read_samples(source):
+    """
+    Reads accelerations from a local source, one sample per line with the x, y and z acceleration separated by commas
+    or whitespace. Lines that can not be parsed, such as a header, are skipped.
+
+    :param source: str.
+        "-"                    read from standard input, e.g. a pipe
+        "tcp://host:port"      listen on a local TCP port and read from the first connection
+        "udp://host:port"      read datagrams sent to a local UDP port
+        path to a file         follow the file as it grows, like tail -f
+    :return: generator of (x, y, z) tuples.
+    """
+    for line in _read_lines(source):
+        values = line.replace(',', ' ').split()
+        if len(values) < 3:
+            continue
+        try:
+            yield tuple(float(v) for v in values[:3])
+        except ValueError:
+            continue
+
+
+def _read_lines(source):
+    """
+    Generator of the lines of a source, see read_samples.
+    """
+    if source == '-':
+        yield from sys.stdin
+    elif source.startswith('tcp://'):
+        host, port = source[len('tcp://'):].rsplit(':', 1)
+        with socket.create_server((host, int(port))) as server:
+            conn, _ = server.accept()
+            with conn, conn.makefile('r') as f:
+                yield from f
+    elif source.startswith('udp://'):
+        host, port = source[len('udp://'):].rsplit(':', 1)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind((host, int(port)))
+            while True:
+                yield from sock.recv(65536).decode().splitlines()
+    else:
+        with open(source, 'r') as f:
+            partial = ''
+            while True:
+                line = partial + f.readline()
+                if line.endswith('\n'):
+                    partial = ''
+                    yield line
+                else:
+                    # no new data, or the writer has not finished the line yet
+                    partial = line
+                    time.sleep(POLL)
@@ -1,5 +1,3 @@
-import scipy
-import statsmodels.tsa.stattools as stattools
 from support_functions.euclidean_norm import euclidean_norm
 
 
@@ -23,13 +21,25 @@ def symmetry(data, ch, **kwargs):
     ad_2: strength of the correlation of the second dominant peak
     autocorr: the autocorrelation signal from the zero phase to signal length.
     """
-
     norm = euclidean_norm(data, keys=ch)
 
     if kwargs:
         event = kwargs.get("event")
         norm = norm[:event]
 
+    return symmetry_norm(norm)
+
+
+def symmetry_norm(norm):
+    """
+    Determines the step and stride time and symmetry of a signal that is already cut to length, see symmetry.
+
+    :param norm: the Euclidean norm of the three acceleration signals.
+    :return: d_1, ad_1, d_2, ad_2, autocorr, see symmetry.
+    """
+    import scipy.signal
+    import statsmodels.tsa.stattools as stattools
+
     _lags = len(norm)
     autocorr = stattools.acf(norm, nlags=_lags)
     peaks_auto, peak_properties = scipy.signal.find_peaks(autocorr, distance=MIN_DISTANCE, height=MIN_HEIGHT)
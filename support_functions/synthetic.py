@@ -0,0 +1,176 @@
+import json
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+# Some hardcoded values
+N_SUBJECTS = 3
+SURFACES = ["grass", "gravel", "pavement"]
+DURATION = 22  # s, about the length of the trials of the outdoor data set
+SAMPLE_RATE = 100  # Hz, as SAMPLE_RATE of outdoor2zoo. Other rates are stored in the trials as sample_rate
+NOISE = 0.05  # g, standard deviation of the sensor noise
+SEED = 0
+DECIMALS = 6  # the accelerations are rounded to this many decimals, which keeps the files small
+
+# Gait of the subjects. Each subject gets a cadence, variability and amplitude drawn around these values.
+CADENCE = 1.8  # steps per second
+CADENCE_SD = 0.1  # between subjects
+STEP_TIME_CV = 0.015  # variability of the step times within a trial
+STEP_TIME_CORRELATION = 0.5  # correlation of consecutive step times, which gives the step times a persistent drift
+AMPLITUDE = 0.35  # g, of the vertical step oscillation
+AMPLITUDE_SD = 0.05
+TILT_SD = 0.01  # g, of the offset of the horizontal axes by the tilt of the sensor on the subject
+ASYMMETRY = 0.3  # relative difference between the left and right steps, so strides are more regular than steps
+HEEL_STRIKE_WIDTH = 0.3  # rad of the step phase, about 25 ms at 1.8 steps per second
+# How the surfaces change the gait: surface -> (cadence factor, step time variability factor, amplitude factor).
+# Surfaces that are not listed walk as on pavement.
+SURFACE_EFFECTS = {"pavement": (1.0, 1.0, 1.0),
+                   "gravel": (0.97, 1.3, 1.05),
+                   "grass": (0.95, 1.5, 0.95),
+                   "stairs": (0.8, 1.8, 1.2)}
+
+
+def synthetic_cohort(n_subjects=N_SUBJECTS, surfaces=None, duration=DURATION, sample_rate=SAMPLE_RATE, noise=NOISE,
+                     seed=SEED):
+    """
+    Generates a cohort in the schema of the outdoor data set, condition -> subject -> {Acc_x, Acc_y, Acc_z,
+    last_step_index}, that outdoor2zoo and outdoor2results read. The trials are generated one at a time when the
+    cohort is iterated, so that large cohorts can be written without keeping them in memory.
+
+    Each trial only depends on the seed, the subject number and the name of the surface, so a subject is the same in a
+    cohort of 3 and of 300 subjects, and a surface is the same whether it is generated alone or with others.
+
+    :param n_subjects: int. Number of subjects, named S01, S02, ...
+    :param surfaces: list of str. The conditions. Default is SURFACES.
+    :param duration: float. Duration of each trial in s.
+    :param sample_rate: float. Sample rate in Hz.
+    :param noise: float. Standard deviation of the sensor noise in g.
+    :param seed: int. Seed of the random generator, the same seed gives the same cohort.
+    :return: generator of (surface, subject, trial).
+    """
+    if n_subjects < 1:
+        raise ValueError('n_subjects must be at least 1, not {0}'.format(n_subjects))
+    if surfaces is None:
+        surfaces = SURFACES
+
+    width = max(2, len(str(n_subjects)))
+    for c in surfaces:
+        cadence, variability, amplitude = SURFACE_EFFECTS.get(c, SURFACE_EFFECTS["pavement"])
+        for s_index in range(n_subjects):
+            subject = _subject(np.random.default_rng([seed, s_index]))
+            rng = np.random.default_rng([seed, s_index, zlib.crc32(c.encode())])
+            trial = synthetic_trial(int(round(duration * sample_rate)), sample_rate, rng,
+                                    cadence=subject["cadence"] * cadence,
+                                    step_time_cv=STEP_TIME_CV * variability,
+                                    amplitude=subject["amplitude"] * amplitude,
+                                    tilt=subject["tilt"], noise=noise)
+            yield c, 'S{0:0{1}d}'.format(s_index + 1, width), trial
+
+
+def synthetic_trial(n, sample_rate=SAMPLE_RATE, rng=None, cadence=CADENCE, step_time_cv=STEP_TIME_CV,
+                    amplitude=AMPLITUDE, tilt=(0.0, 0.0), noise=NOISE):
+    """
+    Generates the accelerations of a gait trial, in g, as a trunk-worn sensor measures them. The step times vary
+    around the cadence with persistent, correlated deviations. Within each step, the vertical axis (Acc_x) has an
+    oscillation around 1 g with a heel strike peak and the anterior-posterior axis (Acc_z) oscillates at the step
+    frequency, both a little stronger for one leg than for the other. The mediolateral axis (Acc_y) sways at the
+    stride frequency, i.e. half the step frequency.
+
+    :param n: int. Number of samples.
+    :param sample_rate: float. Sample rate in Hz.
+    :param rng: numpy.random.Generator. Default is a generator with seed SEED.
+    :param cadence: float. Mean number of steps per second.
+    :param step_time_cv: float. Coefficient of variation of the step times.
+    :param amplitude: float. Amplitude of the vertical oscillation in g, the other axes are scaled with it.
+    :param tilt: (float, float). Offset of Acc_y and Acc_z in g.
+    :param noise: float. Standard deviation of the sensor noise in g.
+    :return: dict with Acc_x, Acc_y and Acc_z as lists and the last_step_index, the first sample of the last step. The
+    sample_rate is added if it is not the SAMPLE_RATE.
+    """
+    if rng is None:
+        rng = np.random.default_rng(SEED)
+
+    t = np.arange(n) / sample_rate
+    # step times with AR(1) deviations, scaled to the coefficient of variation
+    n_steps = int(np.ceil(t[-1] * cadence * 1.5)) + 2
+    deviation = rng.standard_normal(n_steps)
+    for k in range(1, n_steps):
+        deviation[k] += STEP_TIME_CORRELATION * deviation[k - 1]
+    deviation *= np.sqrt(1 - STEP_TIME_CORRELATION ** 2)
+    step_times = np.maximum(1 + step_time_cv * deviation, 0.5) / cadence
+    strikes = np.r_[0, np.cumsum(step_times)] - rng.uniform(0, step_times[0])
+
+    # 2 pi per step, so the stride oscillation is at half the phase
+    phase = 2 * np.pi * np.interp(t, strikes, np.arange(len(strikes)))
+    within_step = np.mod(phase + np.pi, 2 * np.pi) - np.pi
+    # peak at each heel strike, with zero mean over a step so that Acc_x stays around 1 g
+    heel_strike = np.exp(-0.5 * (within_step / HEEL_STRIKE_WIDTH) ** 2) - HEEL_STRIKE_WIDTH / np.sqrt(2 * np.pi)
+
+    # the left and right steps alternate
+    side = 1 + ASYMMETRY * np.where(np.floor(phase / (2 * np.pi)) % 2 == 0, 1, -1)
+
+    acc_x = 1 + amplitude * side * (0.6 * np.cos(phase) + 0.25 * np.cos(2 * phase) + 0.8 * heel_strike)
+    acc_y = tilt[0] + amplitude * (0.3 * np.sin(phase / 2) + 0.08 * np.sin(3 * phase / 2))
+    acc_z = tilt[1] + amplitude * side * (0.6 * np.sin(phase + 0.5) + 0.15 * np.sin(2 * phase))
+    last_step = strikes[(strikes >= 0) & (strikes < t[-1])]
+
+    trial = {
+        "Acc_x": np.round(acc_x + noise * rng.standard_normal(n), DECIMALS).tolist(),
+        "Acc_y": np.round(acc_y + noise * rng.standard_normal(n), DECIMALS).tolist(),
+        "Acc_z": np.round(acc_z + noise * rng.standard_normal(n), DECIMALS).tolist(),
+        "last_step_index": int(np.ceil(last_step[-1] * sample_rate)) if len(last_step) else n,
+    }
+    if sample_rate != SAMPLE_RATE:
+        trial["sample_rate"] = sample_rate
+
+    return trial
+
+
+def write_cohort(file_name, cohort):
+    """
+    Writes a cohort to data.json, or to a zip archive that contains data.json, as the outdoor data set is shipped.
+    The trials are written one at a time, so the cohort is never in memory as a whole.
+
+    :param file_name: str. Full path to the .json or .zip file.
+    :param cohort: iterable of (surface, subject, trial), as synthetic_cohort generates, grouped by surface.
+    :return: int. Number of trials written.
+    """
+    if os.path.splitext(file_name)[1].lower() == '.zip':
+        with zipfile.ZipFile(file_name, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            with zip_ref.open('data.json', 'w', force_zip64=True) as f:
+                return _write_json(f, cohort)
+
+    with open(file_name, 'wb') as f:
+        return _write_json(f, cohort)
+
+
+# embedded functions
+def _subject(rng):
+    """
+    Draws the cadence, amplitude and sensor tilt of a subject.
+    """
+    return {"cadence": CADENCE + CADENCE_SD * rng.standard_normal(),
+            "amplitude": max(AMPLITUDE + AMPLITUDE_SD * rng.standard_normal(), 0.05),
+            "tilt": tuple(TILT_SD * rng.standard_normal(2))}
+
+
+def _write_json(f, cohort):
+    """
+    Writes the cohort as a json object of conditions, each an object of subjects, to a binary file.
+    """
+    n_trials = 0
+    surface = None
+    f.write(b'{')
+    for c, s, trial in cohort:
+        if c != surface:
+            f.write('{0}{1}: {{'.format('}, ' if surface is not None else '', json.dumps(c)).encode())
+            surface = c
+        else:
+            f.write(b', ')
+        f.write('{0}: {1}'.format(json.dumps(s), json.dumps(trial)).encode())
+        n_trials += 1
+    f.write(b'}}' if surface is not None else b'}')
+
+    return n_trials
@@ -0,0 +1,90 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Some hard coded values
+# Time budget in seconds per metric and trial, e.g. {"LyE_R": 60}. Metrics without a budget run to the end.
+TIME_BUDGETS = {}
+# What to do when a metric exceeds its budget:
+#   "cap"          run it again on the first MAX_SAMPLES samples of the trial
+#   "approximate"  run it again with approximate nearest neighbours (LyE_R only, see LyE_R_approximate), without
+#                  estimating the embedding parameters from scratch, see embedding_parameters
+#   "skip"         give up on the metric for this trial, its outcomes are NaN or -999
+# The fallback gets the same budget. If it exceeds it as well, the metric is skipped.
+FALLBACKS = {"sample_entropy": "cap",
+             "symmetry": "skip",
+             "log_dimensionless_jerk_imu": "skip",
+             "LyE_R": "approximate",
+             "multivariate_sample_entropy": "cap",
+             "LyE_R_triaxial": "cap",
+             "cross_sample_entropy": "cap",
+             "rqa": "cap"}
+MAX_SAMPLES = 3000  # samples kept by the "cap" fallback, 30 s at 100 Hz
+
+# Deadline of the metric running in the current thread
+_DEADLINE = threading.local()
+
+
+class TimeBudgetExceeded(Exception):
+    """
+    Raised by check_deadline when the metric running in the current thread is over its time budget.
+    """
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Sets a deadline for the block in the current thread, which the metrics check with check_deadline.
+
+    :param seconds: float. Time budget of the block, or None for no deadline.
+    """
+    previous = getattr(_DEADLINE, 'time', None)
+    _DEADLINE.time = None if seconds is None else time.perf_counter() + seconds
+    try:
+        yield
+    finally:
+        _DEADLINE.time = previous
+
+
+def check_deadline():
+    """
+    Raises TimeBudgetExceeded if the deadline of the current thread has passed. The metrics call this in their
+    expensive loops, so a metric is stopped within one iteration of going over its budget.
+    """
+    limit = getattr(_DEADLINE, 'time', None)
+    if limit is not None and time.perf_counter() > limit:
+        raise TimeBudgetExceeded()
+
+
+def run_with_budget(metric, task, args):
+    """
+    Runs a metric within its time budget and falls back as set in FALLBACKS when the budget is exceeded.
+
+    :param metric: str. Name of the metric in TIME_BUDGETS and FALLBACKS.
+    :param task: function called as task(*args, fallback) that calculates the metric, with fallback None for the
+    normal calculation or the name of the fallback strategy.
+    :param args: tuple of arguments of task.
+    :return: result: what task returned, or None if the metric was skipped.
+    record: dict with the seconds the metric took, including the fallback, and the fallback that was used ("" if the
+    metric finished within its budget).
+    """
+    budget = TIME_BUDGETS.get(metric)
+    start_time = time.perf_counter()
+
+    fallback = ""
+    try:
+        with deadline(budget):
+            result = task(*args, None)
+    except TimeBudgetExceeded:
+        fallback = FALLBACKS.get(metric, "skip")
+        print('WARNING: {0} exceeded its time budget of {1} s, fallback: {2}'.format(metric, budget, fallback))
+        result = None
+        if fallback != "skip":
+            try:
+                with deadline(budget):
+                    result = task(*args, fallback)
+            except TimeBudgetExceeded:
+                print('WARNING: {0} fallback {1} exceeded the time budget as well, skipped'.format(metric, fallback))
+                fallback = "skip"
+
+    return result, {"seconds": time.perf_counter() - start_time, "fallback": fallback}
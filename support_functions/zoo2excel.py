@@ -1,8 +1,20 @@
-import pandas as pd
 from support_functions.engine import engine
 from support_functions.grab import grab
 from support_functions.fileparts import fileparts
 
+from support_functions import registry, progress
+from support_functions.cross_sample_entropy import EVENT_PREFIX
+
+# Some hardcoded values
+KEY_COLUMNS = ["Subject_ID", "Surface", "LeastStepIndex"]
+# the columns of the metrics, and the optional columns that are only written when the trials have their events, are
+# declared in registry.py: column -> (channel, event)
+COLUMNS = KEY_COLUMNS + list(registry.columns())
+# events whose names start with a prefix, one column per event: column prefix -> (channel, event prefix). The
+# cross-sample entropy with each other surface of the subject becomes e.g. CrossSampleEntropy_grass.
+CROSS_SURFACE_COLUMN = "CrossSampleEntropy_"
+PREFIX_COLUMNS = {CROSS_SURFACE_COLUMN: ("Acc_euclidean", EVENT_PREFIX)}
+
 
 def zoo2excel(fld, fld_stats):
     """
@@ -16,50 +28,73 @@ def zoo2excel(fld, fld_stats):
     fl = engine(path=fld, extension=".zoo")
     fl.sort()
 
-    # pre-allocate empty lists
-    surface = []
-    subject_id = []
-    last_step = []
-    samp_ent = []
-    ldlj = []
-    step_sym = []
-    stride_sym = []
-    lye_s = []
-    lye_l = []
-
+    rows = []
+    progress.start_stage('extraction', len(fl))
     for f in fl:
         # extract data
         data = grab(f)
         file_path, file_name, ext = fileparts(f)
-        print('extracting nld on {0}{1} and writing to '.format(file_name, ext))
-
-        # extract subject/condition from file name
-        indx = [i for i, char in enumerate(file_name) if char == '_']
-        subject_id.append(file_name[:indx[0]])
-        surface.append(file_name[indx[0] + 1:])
-        last_step.append(data["Acc_x"]["event"]["FS1"][0])
-
-        # extract non-linear dynamics
-        samp_ent.append(data["Acc_euclidean"]["event"]["sampen"][0])
-        ldlj.append(data["Acc_euclidean"]["event"]["ldlj"][0])
-        step_sym.append(data["Autocorrelation"]["event"]["ad1"][0])
-        stride_sym.append(data["Autocorrelation"]["event"]["ad2"][0])
-        lye_s.append(data["Divergence"]["event"]["LyEs"][0])
-        lye_l.append(data["Divergence"]["event"]["LyEl"][0])
-
-    # create dictionalry from the appended listst
-    data_dict = {
-        "Subject_ID": subject_id,
-        "Surface": surface,
-        "LeastStepIndex": last_step,
-        "SampleEntropy": samp_ent,
-        "LDLJ": ldlj,
-        "StepSymmetry": step_sym,
-        "StrideSymmetry": stride_sym,
-        "LyE_s": lye_s,
-        "LyE_l": lye_l}
+
+        rows.append(extract_results(data, file_name))
+        progress.trial_done('extraction', file_name + ext)
+
+    write_results(rows, fld_stats)
+    progress.end_stage('extraction')
+
+
+def extract_results(data, file_name):
+    """
+    Extracts the calculated non-linear dynamics of a single trial.
+
+    :param data: dictionary containing all data of the trial.
+    :param file_name: name of the zoo file without extension, i.e. subject_condition.
+    :return: dict. One row of the results, keyed by the KEY_COLUMNS, the columns of registry.py and the PREFIX_COLUMNS
+    that the trial has events for, and the time and fallback of each metric if time budgets were set.
+    """
+    # extract subject/condition from file name
+    indx = [i for i, char in enumerate(file_name) if char == '_']
+
+    row = {
+        "Subject_ID": file_name[:indx[0]],
+        "Surface": file_name[indx[0] + 1:],
+        "LeastStepIndex": data["Acc_x"]["event"]["FS1"][0]}
+
+    # extract non-linear dynamics of the metrics that were calculated
+    for column, (ch, event) in {**registry.columns(), **registry.columns(optional=True)}.items():
+        if ch in data and event in data[ch]["event"]:
+            row[column] = data[ch]["event"][event][0]
+    for column, (ch, prefix) in PREFIX_COLUMNS.items():
+        events = data[ch]["event"] if ch in data else {}
+        row.update({column + e[len(prefix):]: v[0] for e, v in events.items() if e.startswith(prefix)})
+
+    if "TimeBudget" in data["zoosystem"]:
+        records = data["zoosystem"]["TimeBudget"]["metrics"]
+        row["BudgetExceeded"] = any(record["fallback"] for record in records.values())
+        for metric, spec in registry.METRICS.items():
+            if metric in records:
+                row[spec["label"] + "Seconds"] = records[metric]["seconds"]
+                row[spec["label"] + "Fallback"] = records[metric]["fallback"]
+
+    return row
+
+
+def write_results(rows, fld_stats):
+    """
+    Writes the rows of results to results.csv in the stats folder.
+
+    :param rows: list of dicts, as returned by extract_results, in the order they should be written.
+    :param fld_stats: full path to stats folder
+    :return: Nothing
+    """
+    import pandas as pd
+
+    # the COLUMNS the rows have first, then any other columns, in the order they first appear. Columns of metrics
+    # that were not calculated are left out.
+    columns = [c for c in COLUMNS if c in KEY_COLUMNS or any(c in row for row in rows)]
+    for row in rows:
+        columns += [c for c in row if c not in columns]
 
     # write to csv
-    df = pd.DataFrame.from_dict(data_dict)
+    df = pd.DataFrame.from_records(rows, columns=columns)
     csv_name = fld_stats + "/results.csv"
     df.to_csv(csv_name)
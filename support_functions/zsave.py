@@ -1,12 +1,17 @@
+import base64
 import json
+import os
 from datetime import datetime
 import inspect
+import numpy as np
 
 
 def zsave(fl, data, message=''):
     """
     Saves zoo files to disk with processing step information appended to the
-    zoosystem 'Processing' branch.
+    zoosystem 'Processing' branch. Channels are numpy arrays and are stored in
+    compact form, as base64 encoded binary data, see encode_array. Use grab to read
+    them back.
 
     Arguments:
     fl -- str. Full path to file.
@@ -37,6 +42,32 @@ def zsave(fl, data, message=''):
             # If it is not a list, convert it to a list
             data['zoosystem']['Processing'] = [data['zoosystem']['Processing'], process]
 
-    # Traditional save
-    with open(fl, 'w') as f:
-        json.dump(data, f, indent=4)
+    # Traditional save, to a temporary file first so that an interrupted save never leaves a partial file behind
+    tmp = '{0}.{1}.tmp'.format(fl, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=4, default=encode_array)
+    os.replace(tmp, fl)
+
+
+def encode_array(obj):
+    """
+    Encodes numpy arrays and scalars for json.dump. An array is stored as a dict with its dtype, its shape and its
+    raw bytes in base64, which is much smaller and faster to write and read than a list of numbers.
+
+    Arguments:
+    obj -- object that json can not serialise by itself.
+
+    Returns:
+    dict, int or float that json can serialise.
+    """
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        return {
+            '__ndarray__': base64.b64encode(obj.data).decode('ascii'),
+            'dtype': obj.dtype.str,
+            'shape': list(obj.shape)
+        }
+    elif isinstance(obj, np.generic):
+        return obj.item()
+
+    raise TypeError('Object of type {0} is not JSON serializable'.format(type(obj).__name__))
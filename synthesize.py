@@ -0,0 +1,21 @@
+import argparse
+from support_functions import synthetic
+
+# Writes a synthetic cohort of gait-like accelerations in the format of the outdoor data set, to test how the pipeline
+# behaves on larger cohorts. Put the file in the root folder as data.json.zip and run main.py as usual:
+#     python synthesize.py data.json.zip --subjects 300
+#     python synthesize.py data.json.zip --subjects 30 --surfaces grass pavement --duration 60 --fs 200
+
+parser = argparse.ArgumentParser(description='Write a synthetic cohort in the format of the outdoor data set.')
+parser.add_argument('file', help='data.json, or a .zip archive that will contain data.json')
+parser.add_argument('--subjects', type=int, default=synthetic.N_SUBJECTS, help='number of subjects')
+parser.add_argument('--surfaces', nargs='+', default=synthetic.SURFACES, help='conditions of each subject')
+parser.add_argument('--duration', type=float, default=synthetic.DURATION, help='seconds per trial')
+parser.add_argument('--fs', type=float, default=synthetic.SAMPLE_RATE, help='sample rate in Hz')
+parser.add_argument('--noise', type=float, default=synthetic.NOISE, help='standard deviation of the noise in g')
+parser.add_argument('--seed', type=int, default=synthetic.SEED, help='the same seed gives the same cohort')
+args = parser.parse_args()
+
+cohort = synthetic.synthetic_cohort(args.subjects, args.surfaces, args.duration, args.fs, args.noise, args.seed)
+n_trials = synthetic.write_cohort(args.file, cohort)
+print('Wrote {0} trials to {1}'.format(n_trials, args.file))
@@ -0,0 +1,31 @@
+import argparse
+import os
+import time
+from support_functions.job_queue import run_worker
+from support_functions.embedding_cache import set_embedding_cache, cache_report
+from support_functions.progress import set_progress, progress_report
+
+# Runs the Step 2 analysis of main.py on trials from the shared job queue. Start main.py with DISTRIBUTED = True on one
+# machine and, once it reports that the job queue is ready, start this script on any other machine that shares the
+# data folder:
+#     python worker.py /path/to/shared/data
+
+parser = argparse.ArgumentParser(description='Analyse trials from the shared job queue in the data folder.')
+parser.add_argument('fld', help='full path to the shared data folder, as mounted on this machine')
+parser.add_argument('--name', default=None, help='name of this worker, default is hostname:pid')
+parser.add_argument('--embedding-cache', default=None,
+                    help='full path to the SQLite cache of the embedding parameters, see EMBEDDING_CACHE in main.py')
+parser.add_argument('--progress-file', default=None,
+                    help='full path to the file the progress is written to, in the Prometheus text format')
+parser.add_argument('--verbose', action='store_true', help='print a line for every trial')
+args = parser.parse_args()
+
+# the policy of the cache and the other settings of main.py are taken from the job queue
+set_embedding_cache(os.path.abspath(args.embedding_cache) if args.embedding_cache else None)
+set_progress(os.path.abspath(args.progress_file) if args.progress_file else None, args.verbose)
+
+start_time = time.time()
+n_done = run_worker(args.fld, args.name)
+print('Finished, analysed {0} trials'.format(n_done))
+cache_report(since=start_time)
+progress_report()